@@ -1,24 +1,825 @@
+import time
+_import_started = time.perf_counter()  # start of the PROFILE_IMPORT report
 import json
-import boto3
 import base64
+import gzip
+import hashlib
+import hmac
 import os
+import threading
+import uuid
+import zlib
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from itertools import islice
 from urllib.parse import parse_qs
-from datetime import datetime
+from datetime import datetime, timedelta, timezone
+
+try:
+    import brotli  # optional: smaller UI payloads for browsers that accept "br"
+except ImportError:
+    brotli = None
+
+# -------------------- STARTUP --------------------
+# PROFILE_IMPORT=true logs how long each startup phase takes: module import
+# phases as the module loads, lazy ones (S3 client, UI page) on first use.
+# The timings are also on /stats and on the first metrics line of a container.
+PROFILE_IMPORT = os.environ.get("PROFILE_IMPORT", "false").lower() == "true"
+startup_phases = {}  # phase -> ms
+
+def startup_phase(name, started):
+    elapsed = round((time.perf_counter() - started) * 1000, 3)
+    startup_phases[name] = elapsed
+    if PROFILE_IMPORT:
+        print(json.dumps({"event": "startup_phase", "phase": name, "ms": elapsed}))
+
+startup_phase("imports", _import_started)
+_phase_started = time.perf_counter()
 
 # -------------------- CONFIG --------------------
 S3_BUCKET = os.environ.get("SECRETS_BUCKET", "my-secrets-bucket-123456")
-s3 = boto3.client("s3")
 
-# Hard-coded users and passwords
+# Where everything is stored: "s3" (the bucket above) or "sqlite", a single
+# database file at STORAGE_PATH, for running the garden without AWS (see
+# serve() at the end of this file). Inside Lambda only /tmp is writable, and
+# it lasts as long as the container, so there it is scratch space for tests.
+STORAGE_BACKEND = os.environ.get("STORAGE_BACKEND", "s3").lower()
+STORAGE_PATH = os.environ.get(
+    "STORAGE_PATH", "/tmp/garden.db" if os.environ.get("AWS_LAMBDA_FUNCTION_NAME") else "garden.db"
+)
+if STORAGE_BACKEND not in ("s3", "sqlite"):
+    raise ValueError(f"STORAGE_BACKEND must be 's3' or 'sqlite', not {STORAGE_BACKEND!r}")
+
+# Number of concurrent S3 calls used for metadata fan-out. The client's
+# connection pool is sized to match so workers never wait on a socket.
+S3_CONCURRENCY = int(os.environ.get("S3_CONCURRENCY", "32"))
+
+# POST /batch-get limits: keys per request and reads in flight at once.
+BATCH_MAX_KEYS = int(os.environ.get("BATCH_MAX_KEYS", "100"))
+BATCH_CONCURRENCY = int(os.environ.get("BATCH_CONCURRENCY", "16"))
+# Content returned by one /batch-get, in encoded bytes. Function URL responses
+# are capped at 6 MB; keys past the budget come back "deferred".
+BATCH_RESPONSE_BYTES = 5 * 1024 * 1024
+
+# Prefix renames copy this many keys per batch (and delete them with one
+# DeleteObjects call, which takes at most 1000 keys).
+RENAME_BATCH_SIZE = 1000
+
+# POST /import writes this many records concurrently per chunk, and stops
+# starting new chunks near the end of the invocation (the caller resumes with
+# ?offset=); prefix renames and exports stop the same way. The reserve kept
+# back is IMPORT_TIME_RESERVE_FRACTION of the time the request started with,
+# at most IMPORT_TIME_RESERVE_MS, plus the longest chunk so far. The first
+# chunk always runs, so every call makes progress.
+IMPORT_CHUNK_SIZE = int(os.environ.get("IMPORT_CHUNK_SIZE", "200"))
+IMPORT_TIME_RESERVE_MS = 5000
+IMPORT_TIME_RESERVE_FRACTION = 0.2
+
+# POST /export streams archives here in multipart-upload parts of this size,
+# reading secrets concurrently but with at most EXPORT_BYTES_IN_FLIGHT of
+# stored content held at once (a bigger secret is read on its own). Like
+# imports it stops early near the end of the invocation; the manifest then
+# names the key to continue after (?startAfter=).
+EXPORT_PREFIX = ".garden/exports/"
+MULTIPART_PART_SIZE = 8 * 1024 * 1024
+EXPORT_BYTES_IN_FLIGHT = int(os.environ.get("EXPORT_BYTES_IN_FLIGHT", str(64 * 1024 * 1024)))
+
+# Function URL payloads are capped at 6 MB (base64 included). /get returns
+# secrets up to GET_INLINE_MAX_BYTES in the response and redirects to a
+# presigned S3 URL, valid PRESIGN_TTL seconds, for anything larger; a Range
+# request is served in slices of at most that size. Secret writes above
+# MULTIPART_WRITE_THRESHOLD are uploaded in parts of that size (S3's minimum).
+GET_INLINE_MAX_BYTES = 4 * 1024 * 1024
+PRESIGN_TTL = 60
+MULTIPART_WRITE_THRESHOLD = 5 * 1024 * 1024
+
+# Warm-container cache of (owner, history id, ETag) per key, used for access
+# checks. Entries expire after META_CACHE_TTL seconds; 0 entries disables it.
+META_CACHE_SIZE = int(os.environ.get("META_CACHE_SIZE", "1024"))
+META_CACHE_TTL = float(os.environ.get("META_CACHE_TTL", "30"))
+
+# Warm-container cache of secret bodies for /get, bounded by total bytes.
+# Entries are revalidated against S3 with If-None-Match on every read.
+CONTENT_CACHE_BYTES = int(os.environ.get("CONTENT_CACHE_BYTES", str(8 * 1024 * 1024)))
+
+# With COMPRESSION=gzip, text secrets of at least COMPRESS_MIN_BYTES are stored
+# gzip-compressed and the object's "encoding" metadata says so. A compressed
+# copy that saves less than COMPRESS_MIN_SAVING of the size is not worth it.
+COMPRESSION = os.environ.get("COMPRESSION", "none").lower()
+COMPRESS_MIN_BYTES = int(os.environ.get("COMPRESS_MIN_BYTES", "1024"))
+COMPRESS_LEVEL = int(os.environ.get("COMPRESS_LEVEL", "6"))
+COMPRESS_MIN_SAVING = 0.1
+if COMPRESSION not in ("none", "gzip"):
+    raise ValueError(f"COMPRESSION must be 'none' or 'gzip', not {COMPRESSION!r}")
+
+# Per-request metrics: one CloudWatch Embedded Metric Format line on stdout per
+# invocation, and warm-container histograms on the admin /stats endpoint.
+METRICS_NAMESPACE = os.environ.get("METRICS_NAMESPACE", "GardenOfSecrets")
+METRICS_EMF = os.environ.get("METRICS_EMF", "true").lower() == "true"
+METRICS_HISTOGRAMS = os.environ.get("METRICS_HISTOGRAMS", "true").lower() == "true"
+
+class LazyS3Client:
+    """Stands in for the boto3 S3 client and builds it on first attribute
+    access, so requests that never touch S3 (like GET /) never load the SDK."""
+
+    def __init__(self):
+        self._client = None
+        self._lock = threading.Lock()
+
+    def _build(self):
+        started = time.perf_counter()
+        import boto3
+        from botocore.config import Config
+        startup_phase("boto3_import", started)
+        started = time.perf_counter()
+        client = boto3.client("s3", config=Config(max_pool_connections=S3_CONCURRENCY))
+        # Every S3 API call is counted and timed against the current request (see RequestState).
+        client.meta.events.register("before-call.s3", lambda **kwargs: request_state.count_call(**kwargs))
+        client.meta.events.register("after-call.s3", lambda **kwargs: request_state.finish_call(**kwargs))
+        client.meta.events.register("after-call-error.s3", lambda **kwargs: request_state.finish_call(**kwargs))
+        startup_phase("s3_client", started)
+        return client
+
+    def __getattr__(self, name):
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    self._client = self._build()
+        return getattr(self._client, name)
+
+# -------------------- STORAGE --------------------
+# The storage interface is the part of the S3 client API the garden uses:
+# get_object (IfNoneMatch, IfMatch, Range), head_object, put_object and
+# copy_object (IfMatch / IfNoneMatch="*"), delete_object(s), list_objects_v2
+# and its paginator, and multipart uploads. A backend returns the same
+# response shapes and raises `exceptions.ClientError` (with the S3 error code
+# in e.response["Error"]["Code"]) and `exceptions.NoSuchKey`, so the rest of
+# the module does not know which one it talks to. generate_presigned_url is
+# optional; /get falls back to Range reads without it.
+class StorageError(Exception):
+    """A failed storage call, shaped like botocore's ClientError."""
+
+    def __init__(self, code, message, status):
+        super().__init__(f"{code}: {message}")
+        self.response = {"Error": {"Code": code, "Message": message}, "ResponseMetadata": {"HTTPStatusCode": status}}
+
+class NoSuchKeyError(StorageError):
+    def __init__(self, key):
+        super().__init__("NoSuchKey", f"No such key: {key}", 404)
+
+def precondition_failed():
+    return StorageError("PreconditionFailed", "At least one of the preconditions did not hold", 412)
+
+class StoredBody:
+    """The "Body" of a get_object response: the subset of botocore's StreamingBody we use."""
+
+    def __init__(self, data):
+        self._data = data
+        self._position = 0
+
+    def read(self, amt=None):
+        end = len(self._data) if amt is None else self._position + amt
+        chunk = self._data[self._position:end]
+        self._position += len(chunk)
+        return chunk
+
+    def iter_chunks(self, chunk_size=1024):
+        while True:
+            chunk = self.read(chunk_size)
+            if not chunk:
+                return
+            yield chunk
+
+    def close(self):
+        self._data = b""
+
+def storage_operation(name):
+    """Count and time a local storage call like an S3 API call (see RequestState)."""
+    def decorate(fn):
+        def call(self, *args, **kwargs):
+            request_state.count_call()
+            started = time.perf_counter()
+            try:
+                return fn(self, *args, **kwargs)
+            finally:
+                request_state.record_call(name, (time.perf_counter() - started) * 1000)
+        call.__name__ = fn.__name__
+        call.__doc__ = fn.__doc__
+        return call
+    return decorate
+
+def etag_of(data):
+    return '"' + hashlib.md5(data).hexdigest() + '"'
+
+def key_range_end(prefix):
+    """The smallest string after every key that starts with `prefix`."""
+    return prefix[:-1] + chr(ord(prefix[-1]) + 1)
+
+class SQLiteStorage:
+    """Storage backend on one SQLite file, for self-hosting and tests.
+
+    Keys are the table's primary key, so HEADs and GETs are index lookups and
+    listings are range scans in the same UTF-8 order S3 uses. Conditional
+    writes check and write inside one IMMEDIATE transaction, which makes them
+    atomic across threads and processes sharing the file. Bucket arguments
+    are accepted and ignored.
+    """
+
+    class exceptions:
+        ClientError = StorageError
+        NoSuchKey = NoSuchKeyError
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS objects (
+            key TEXT PRIMARY KEY,
+            etag TEXT NOT NULL,
+            size INTEGER NOT NULL,
+            last_modified TEXT NOT NULL,
+            metadata TEXT NOT NULL,
+            content_type TEXT NOT NULL,
+            content_encoding TEXT,
+            body BLOB NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS uploads (
+            upload_id TEXT PRIMARY KEY,
+            key TEXT NOT NULL,
+            metadata TEXT NOT NULL,
+            content_type TEXT NOT NULL,
+            content_encoding TEXT
+        );
+        CREATE TABLE IF NOT EXISTS parts (
+            upload_id TEXT NOT NULL,
+            number INTEGER NOT NULL,
+            etag TEXT NOT NULL,
+            body BLOB NOT NULL,
+            PRIMARY KEY (upload_id, number)
+        );
+    """
+    # Listing and HEAD columns come first, so those queries never read a body.
+    HEAD_COLUMNS = "etag, size, last_modified, metadata, content_type, content_encoding"
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        self._schema_lock = threading.Lock()
+        self._schema_ready = False
+
+    def _db(self):
+        db = getattr(self._local, "db", None)
+        if db is None:
+            started = time.perf_counter()
+            import sqlite3
+            # Autocommit; writes that must be atomic open their own transaction.
+            db = sqlite3.connect(self.path, timeout=30, isolation_level=None, check_same_thread=False)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            with self._schema_lock:
+                if not self._schema_ready:
+                    db.executescript(self.SCHEMA)
+                    self._schema_ready = True
+                    startup_phase("sqlite_open", started)
+            self._local.db = db
+        return db
+
+    def _transaction(self, fn):
+        db = self._db()
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            result = fn(db)
+        except BaseException:
+            db.execute("ROLLBACK")
+            raise
+        db.execute("COMMIT")
+        return result
+
+    @staticmethod
+    def _head(row):
+        etag, size, last_modified, metadata, content_type, content_encoding = row[:6]
+        head = {
+            "ETag": etag,
+            "ContentLength": size,
+            "LastModified": datetime.fromisoformat(last_modified),
+            "Metadata": json.loads(metadata),
+            "ContentType": content_type,
+        }
+        if content_encoding:
+            head["ContentEncoding"] = content_encoding
+        return head
+
+    @staticmethod
+    def _check(db, key, IfMatch=None, IfNoneMatch=None):
+        row = db.execute("SELECT etag FROM objects WHERE key = ?", (key,)).fetchone()
+        if IfNoneMatch == "*" and row is not None:
+            raise precondition_failed()
+        if IfMatch:
+            if row is None:
+                raise NoSuchKeyError(key)
+            if IfMatch != "*" and IfMatch != row[0]:
+                raise precondition_failed()
+
+    @staticmethod
+    def _store(db, key, data, metadata, content_type, content_encoding, etag=None):
+        last_modified = datetime.now(timezone.utc).replace(microsecond=0)
+        etag = etag or etag_of(data)
+        db.execute(
+            "INSERT OR REPLACE INTO objects VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (key, etag, len(data), last_modified.isoformat(), json.dumps(metadata or {}),
+             content_type or "binary/octet-stream", content_encoding, data)
+        )
+        return {"ETag": etag, "LastModified": last_modified}
+
+    @storage_operation("GetObject")
+    def get_object(self, Bucket=None, Key=None, IfNoneMatch=None, IfMatch=None, Range=None):
+        row = self._db().execute(f"SELECT {self.HEAD_COLUMNS}, body FROM objects WHERE key = ?", (Key,)).fetchone()
+        if row is None:
+            raise NoSuchKeyError(Key)
+        obj = self._head(row)
+        if IfMatch and IfMatch != obj["ETag"]:
+            raise precondition_failed()
+        if IfNoneMatch and IfNoneMatch in ("*", obj["ETag"]):
+            raise StorageError("304", "Not Modified", 304)
+        body = row[6]
+        if Range:
+            start, _, end = Range[len("bytes="):].partition("-")
+            size = len(body)
+            first = int(start) if start else max(size - int(end), 0)
+            last = min(int(end), size - 1) if start and end else size - 1
+            if first >= size or first > last or (not start and int(end) == 0):
+                raise StorageError("InvalidRange", "The requested range is not satisfiable", 416)
+            body = body[first:last + 1]
+            obj["ContentRange"] = f"bytes {first}-{last}/{size}"
+            obj["ContentLength"] = len(body)
+        obj["Body"] = StoredBody(body)
+        return obj
+
+    @storage_operation("HeadObject")
+    def head_object(self, Bucket=None, Key=None):
+        row = self._db().execute(f"SELECT {self.HEAD_COLUMNS} FROM objects WHERE key = ?", (Key,)).fetchone()
+        if row is None:
+            # S3 answers a HEAD without a body, so the code is the bare status.
+            raise StorageError("404", "Not Found", 404)
+        return self._head(row)
+
+    @storage_operation("PutObject")
+    def put_object(self, Bucket=None, Key=None, Body=b"", Metadata=None, ContentType=None, ContentEncoding=None,
+                   IfMatch=None, IfNoneMatch=None, ServerSideEncryption=None):
+        data = Body.encode("utf-8") if isinstance(Body, str) else bytes(Body)
+
+        def put(db):
+            self._check(db, Key, IfMatch, IfNoneMatch)
+            return {"ETag": self._store(db, Key, data, Metadata, ContentType, ContentEncoding)["ETag"]}
+        return self._transaction(put)
+
+    @storage_operation("CopyObject")
+    def copy_object(self, Bucket=None, Key=None, CopySource=None, MetadataDirective="COPY", Metadata=None,
+                    ContentType=None, ContentEncoding=None, IfMatch=None, IfNoneMatch=None, ServerSideEncryption=None):
+        def copy(db):
+            row = db.execute(f"SELECT {self.HEAD_COLUMNS}, body FROM objects WHERE key = ?",
+                             (CopySource["Key"],)).fetchone()
+            if row is None:
+                raise NoSuchKeyError(CopySource["Key"])
+            self._check(db, Key, IfMatch, IfNoneMatch)
+            source = self._head(row)
+            if MetadataDirective == "REPLACE":
+                metadata, content_type, content_encoding = Metadata, ContentType, ContentEncoding
+            else:
+                metadata, content_type = source["Metadata"], source["ContentType"]
+                content_encoding = source.get("ContentEncoding")
+            return {"CopyObjectResult": self._store(db, Key, row[6], metadata, content_type, content_encoding, source["ETag"])}
+        return self._transaction(copy)
+
+    @storage_operation("DeleteObject")
+    def delete_object(self, Bucket=None, Key=None):
+        self._db().execute("DELETE FROM objects WHERE key = ?", (Key,))
+        return {}
+
+    @storage_operation("DeleteObjects")
+    def delete_objects(self, Bucket=None, Delete=None):
+        keys = [(o["Key"],) for o in Delete["Objects"]]
+        self._transaction(lambda db: db.executemany("DELETE FROM objects WHERE key = ?", keys))
+        return {"Errors": []}
+
+    @storage_operation("ListObjectsV2")
+    def list_objects_v2(self, Bucket=None, Prefix="", StartAfter="", ContinuationToken=None, MaxKeys=1000):
+        # The continuation token is simply the last key returned.
+        sql = "SELECT key, etag, size, last_modified FROM objects WHERE key > ?"
+        params = [ContinuationToken or StartAfter or ""]
+        if Prefix:
+            sql += " AND key >= ? AND key < ?"
+            params += [Prefix, key_range_end(Prefix)]
+        rows = self._db().execute(sql + " ORDER BY key LIMIT ?", (*params, MaxKeys + 1)).fetchall()
+        truncated = len(rows) > MaxKeys
+        rows = rows[:MaxKeys]
+        resp = {
+            "Contents": [
+                {"Key": key, "ETag": etag, "Size": size, "LastModified": datetime.fromisoformat(last_modified)}
+                for key, etag, size, last_modified in rows
+            ],
+            "KeyCount": len(rows),
+            "IsTruncated": truncated,
+        }
+        if truncated:
+            resp["NextContinuationToken"] = rows[-1][0]
+        return resp
+
+    def get_paginator(self, operation):
+        if operation != "list_objects_v2":
+            raise ValueError(f"No paginator for {operation}")
+        return SQLitePaginator(self)
+
+    @storage_operation("CreateMultipartUpload")
+    def create_multipart_upload(self, Bucket=None, Key=None, ContentType=None, ContentEncoding=None, Metadata=None,
+                                ServerSideEncryption=None):
+        upload_id = uuid.uuid4().hex
+        self._db().execute(
+            "INSERT INTO uploads VALUES (?, ?, ?, ?, ?)",
+            (upload_id, Key, json.dumps(Metadata or {}), ContentType or "binary/octet-stream", ContentEncoding)
+        )
+        return {"UploadId": upload_id}
+
+    @storage_operation("UploadPart")
+    def upload_part(self, Bucket=None, Key=None, UploadId=None, PartNumber=None, Body=b""):
+        data = bytes(Body)
+        etag = etag_of(data)
+        self._db().execute("INSERT OR REPLACE INTO parts VALUES (?, ?, ?, ?)", (UploadId, PartNumber, etag, data))
+        return {"ETag": etag}
+
+    @storage_operation("CompleteMultipartUpload")
+    def complete_multipart_upload(self, Bucket=None, Key=None, UploadId=None, MultipartUpload=None,
+                                  IfMatch=None, IfNoneMatch=None):
+        def complete(db):
+            upload = db.execute("SELECT metadata, content_type, content_encoding FROM uploads WHERE upload_id = ?",
+                                (UploadId,)).fetchone()
+            if upload is None:
+                raise StorageError("NoSuchUpload", f"No such upload: {UploadId}", 404)
+            self._check(db, Key, IfMatch, IfNoneMatch)
+            parts = dict(((n, (etag, body)) for n, etag, body in
+                          db.execute("SELECT number, etag, body FROM parts WHERE upload_id = ?", (UploadId,))))
+            chosen = [parts[p["PartNumber"]] for p in MultipartUpload["Parts"]]
+            # S3's multipart ETag: MD5 of the part MD5s, then the part count.
+            digests = b"".join(bytes.fromhex(etag.strip('"')) for etag, _ in chosen)
+            etag = f'"{hashlib.md5(digests).hexdigest()}-{len(chosen)}"'
+            stored = self._store(db, Key, b"".join(body for _, body in chosen), json.loads(upload[0]),
+                                 upload[1], upload[2], etag)
+            db.execute("DELETE FROM parts WHERE upload_id = ?", (UploadId,))
+            db.execute("DELETE FROM uploads WHERE upload_id = ?", (UploadId,))
+            return {"Key": Key, "ETag": stored["ETag"]}
+        return self._transaction(complete)
+
+    @storage_operation("AbortMultipartUpload")
+    def abort_multipart_upload(self, Bucket=None, Key=None, UploadId=None):
+        def abort(db):
+            db.execute("DELETE FROM parts WHERE upload_id = ?", (UploadId,))
+            db.execute("DELETE FROM uploads WHERE upload_id = ?", (UploadId,))
+        self._transaction(abort)
+        return {}
+
+class SQLitePaginator:
+    def __init__(self, storage):
+        self.storage = storage
+
+    def paginate(self, Bucket=None, Prefix="", PaginationConfig=None):
+        page_size = (PaginationConfig or {}).get("PageSize", 1000)
+        token = None
+        while True:
+            page = self.storage.list_objects_v2(Bucket=Bucket, Prefix=Prefix, ContinuationToken=token, MaxKeys=page_size)
+            yield page
+            if not page["IsTruncated"]:
+                return
+            token = page["NextContinuationToken"]
+
+storage = LazyS3Client() if STORAGE_BACKEND == "s3" else SQLiteStorage(STORAGE_PATH)
+EXECUTOR_THREAD_PREFIX = "garden-s3"
+executor = ThreadPoolExecutor(max_workers=S3_CONCURRENCY, thread_name_prefix=EXECUTOR_THREAD_PREFIX)
+
+# Bookkeeping objects (owner index, ...) live under this prefix. It is hidden
+# from listings and cannot be used as a secret key.
+INTERNAL_PREFIX = ".garden/"
+# Whole-bucket listings jump to just past the reserved range (with StartAfter)
+# once they reach it, instead of paging through every history and change-log
+# object. The keys we write there are ASCII, so none sorts after this.
+INTERNAL_LIST_AFTER = INTERNAL_PREFIX + "\U0010ffff"
+# The owner index: one shard per owner under here, plus a marker written once
+# every shard of a full build is in place.
+INDEX_SHARD_PREFIX = INTERNAL_PREFIX + "index/owners/"
+INDEX_MARKER_KEY = INTERNAL_PREFIX + "index/complete"
+INDEX_RETRIES = 5
+
+# Update history is stored as one small object per entry under here.
+HISTORY_PREFIX = INTERNAL_PREFIX + "history/"
+HISTORY_PAGE_SIZE = 50
+
+# Largest page /list will return, and the page size when the caller passes no
+# ?limit=; either way the rest follows via X-Next-Cursor.
+LIST_MAX_LIMIT = 1000
+
+# Change feed (/list?since=): one object per index update under here. A poll
+# reads at most CHANGES_PAGE_SIZE of them and only those older than
+# CHANGES_SETTLE_MS, so writes still in flight elsewhere are not skipped.
+CHANGES_PREFIX = INTERNAL_PREFIX + "changes/"
+CHANGES_PAGE_SIZE = 100
+CHANGES_SETTLE_MS = int(os.environ.get("CHANGES_SETTLE_MS", "5000"))
+# Change records are kept this long; a cursor older than that gets 410 Gone and
+# the client falls back to a full /list. Each container deletes expired records
+# at most once per CHANGES_PRUNE_INTERVAL seconds, up to 1000 at a time.
+CHANGES_RETENTION_HOURS = int(os.environ.get("CHANGES_RETENTION_HOURS", "168"))
+CHANGES_PRUNE_INTERVAL = 3600
+
+# /search returns this many matches unless ?limit= asks for more (up to
+# LIST_MAX_LIMIT). Search views are cached per user for the current index.
+SEARCH_DEFAULT_LIMIT = 20
+SEARCH_CACHE_SIZE = 16
+
+# Hard-coded users and their password hashes, made with hash_password().
+# These are the demo passwords from the README: alice/password1, bob/password2,
+# carol/12345.
 USERS = {
-    "alice": "password1",
-    "bob":   "password2",
-    "carol": "12345"   # admin example
+    "alice": "pbkdf2_sha256$600000$uy9P7EPb5xK3I0pgTvdLfQ==$c4uB22hGLnJWL6tn96ANir/XCaA2wc0F8D5p56GAOHg=",
+    "bob":   "pbkdf2_sha256$600000$cxW9TCvIS4MZ7OQ/SSlIYw==$ITXxJkGvExt6yWBtgzHsFzYk4ceX4/lJeIga+Zq7Sak=",
+    "carol": "pbkdf2_sha256$600000$c+2P0T9UuBTd4qF13LSiCg==$YFGxXOcjuimFAMK06QXp3k8E/n/G2EysgQNVN9JrEyU="   # admin example
 }
 
 # Admin users have full access to all secrets
 ADMINS = {"carol"}
 
+# Optional S3 object in the secrets bucket (e.g. ".garden/users.json") holding
+# {"users": {name: hash}, "admins": [names]}. When set it replaces USERS and
+# ADMINS, and is re-checked every USERS_REFRESH_SECONDS.
+USERS_OBJECT = os.environ.get("USERS_OBJECT", "")
+USERS_REFRESH_SECONDS = 300
+if USERS_OBJECT:
+    USERS, ADMINS = {}, set()  # filled from S3 on first use
+PBKDF2_ITERATIONS = 600000
+
+# POST /login issues HMAC-signed session tokens valid for SESSION_TTL seconds,
+# signed with SESSION_SECRET. With S3, tokens need it: a key kept in the bucket
+# could have been planted by anyone else who can write there, and would let
+# them mint tokens for any user. Without it /login and Bearer auth fail, while
+# Basic auth and GET / still work. The SQLite backend is a local file, so there
+# a random key is generated once and kept in the database.
+SESSION_SECRET = os.environ.get("SESSION_SECRET", "")
+SESSION_KEY_OBJECT = INTERNAL_PREFIX + "session-key"
+SESSION_TTL = int(os.environ.get("SESSION_TTL", "3600"))
+
+# Basic credentials that passed the (deliberately slow) hash check are
+# remembered per container, so repeat requests skip it.
+AUTH_CACHE_SIZE = 256
+AUTH_CACHE_TTL = 300
+
+# -------------------- CACHING --------------------
+class LRUCache:
+    """Thread-safe LRU with optional TTL. Capacity is counted with `sizeof`
+    (one unit per entry by default); a capacity of 0 disables the cache."""
+
+    def __init__(self, capacity, ttl=None, sizeof=None):
+        self.capacity = capacity
+        self.ttl = ttl
+        self.sizeof = sizeof or (lambda value: 1)
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            if item is not None and self.ttl is not None and time.monotonic() - item[1] > self.ttl:
+                self._discard(key)
+                item = None
+            if item is None:
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return item[0]
+
+    def put(self, key, value):
+        weight = self.sizeof(value)
+        with self._lock:
+            self._discard(key)
+            if weight > self.capacity:
+                return
+            self._data[key] = (value, time.monotonic(), weight)
+            self.size += weight
+            while self.size > self.capacity:
+                oldest = next(iter(self._data))
+                self._discard(oldest)
+                self.evictions += 1
+
+    def invalidate(self, key):
+        with self._lock:
+            self._discard(key)
+
+    def _discard(self, key):
+        item = self._data.pop(key, None)
+        if item is not None:
+            self.size -= item[2]
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._data),
+                "size": self.size,
+                "capacity": self.capacity,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else None,
+            }
+
+metadata_cache = LRUCache(META_CACHE_SIZE, ttl=META_CACHE_TTL)
+# Values are (etag, stored body bytes, encoding); weighed by body length.
+content_cache = LRUCache(CONTENT_CACHE_BYTES, sizeof=lambda value: len(value[1]))
+content_not_modified = 0
+
+# -------------------- METRICS --------------------
+# Upper bounds (ms) of the histogram buckets; the last bucket is open-ended.
+LATENCY_BUCKETS_MS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+class Histogram:
+    """Fixed-bucket latency histogram; percentiles are bucket upper bounds
+    (capped at the largest value seen)."""
+
+    def __init__(self):
+        self.buckets = [0] * (len(LATENCY_BUCKETS_MS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, value):
+        self.buckets[bisect_right(LATENCY_BUCKETS_MS, value)] += 1
+        self.count += 1
+        self.total += value
+        self.max = max(self.max, value)
+
+    def percentile(self, pct):
+        rank = self.count * pct / 100
+        seen = 0
+        for i, n in enumerate(self.buckets):
+            seen += n
+            if n and seen >= rank:
+                bound = LATENCY_BUCKETS_MS[i] if i < len(LATENCY_BUCKETS_MS) else self.max
+                return round(min(bound, self.max), 3)
+        return None
+
+    def snapshot(self):
+        return {
+            "count": self.count,
+            "mean_ms": round(self.total / self.count, 3) if self.count else None,
+            "p50_ms": self.percentile(50),
+            "p90_ms": self.percentile(90),
+            "p99_ms": self.percentile(99),
+            "max_ms": round(self.max, 3),
+        }
+
+class Metrics:
+    """Warm-container aggregates of request and S3 metrics for /stats."""
+
+    def __init__(self):
+        self.routes = {}  # route -> {"duration": Histogram, "s3_ms": Histogram, counters...}
+        self.s3_operations = {}  # S3 operation name -> Histogram
+        self.cold_starts = 0
+        self._lock = threading.Lock()
+
+    def observe_request(self, route, status, duration_ms, s3_calls, s3_ms, bytes_in, bytes_out, cold):
+        with self._lock:
+            self.cold_starts += int(cold)
+            entry = self.routes.get(route)
+            if entry is None:
+                entry = self.routes[route] = {
+                    "duration": Histogram(), "s3_ms": Histogram(), "statuses": {},
+                    "s3_calls": 0, "bytes_in": 0, "bytes_out": 0,
+                }
+            entry["duration"].observe(duration_ms)
+            entry["s3_ms"].observe(s3_ms)
+            entry["statuses"][str(status)] = entry["statuses"].get(str(status), 0) + 1
+            entry["s3_calls"] += s3_calls
+            entry["bytes_in"] += bytes_in
+            entry["bytes_out"] += bytes_out
+
+    def observe_s3(self, operation, elapsed_ms):
+        with self._lock:
+            self.s3_operations.setdefault(operation, Histogram()).observe(elapsed_ms)
+
+    def snapshot(self):
+        with self._lock:
+            routes = {}
+            for route, entry in self.routes.items():
+                requests = entry["duration"].count
+                routes[route] = {
+                    **entry["duration"].snapshot(),
+                    "statuses": dict(entry["statuses"]),
+                    "s3_calls_mean": round(entry["s3_calls"] / requests, 2),
+                    "s3_time": entry["s3_ms"].snapshot(),
+                    "bytes_in": entry["bytes_in"],
+                    "bytes_out": entry["bytes_out"],
+                }
+            return {
+                "cold_starts": self.cold_starts,
+                "routes": routes,
+                "s3_operations": {op: h.snapshot() for op, h in self.s3_operations.items()},
+            }
+
+metrics = Metrics()
+cold_start = True
+
+# Paths reported under their own name; anything else is grouped as "other" so
+# scanners cannot blow up the metric cardinality.
+METRIC_ROUTES = {
+    "/", "/login", "/list", "/search", "/stats", "/reindex", "/get", "/batch-get", "/import", "/export", "/restore",
+    "/meta", "/history", "/create", "/save", "/delete", "/exists", "/rename",
+}
+
+def body_size(body):
+    if not body:
+        return 0
+    return len(body) if isinstance(body, bytes) else len(body.encode("utf-8"))
+
+def record_request_metrics(event, context, response, duration_ms):
+    """Emit one EMF line for the request and fold it into the /stats histograms."""
+    global cold_start
+    path = event.get("rawPath", "/")
+    route = path if path in METRIC_ROUTES else "other"
+    status = response["statusCode"] if response else 500
+    bytes_in = body_size(event.get("body"))
+    bytes_out = body_size(response.get("body")) if response else 0
+    was_cold, cold_start = cold_start, False
+    state = request_state
+    if METRICS_HISTOGRAMS:
+        metrics.observe_request(route, status, duration_ms, state.s3_calls, state.s3_ms, bytes_in, bytes_out, was_cold)
+    if METRICS_EMF:
+        print(json.dumps({
+            "_aws": {
+                "Timestamp": int(time.time() * 1000),
+                "CloudWatchMetrics": [{
+                    "Namespace": METRICS_NAMESPACE,
+                    "Dimensions": [["Route"]],
+                    "Metrics": [
+                        {"Name": "Duration", "Unit": "Milliseconds"},
+                        {"Name": "S3Calls", "Unit": "Count"},
+                        {"Name": "S3Time", "Unit": "Milliseconds"},
+                        {"Name": "BytesIn", "Unit": "Bytes"},
+                        {"Name": "BytesOut", "Unit": "Bytes"},
+                        {"Name": "ColdStart", "Unit": "Count"},
+                    ],
+                }],
+            },
+            "Route": route,
+            "Method": event.get("requestContext", {}).get("http", {}).get("method", ""),
+            "StatusCode": status,
+            "Duration": round(duration_ms, 3),
+            "S3Calls": state.s3_calls,
+            "S3Time": round(state.s3_ms, 3),
+            "BytesIn": bytes_in,
+            "BytesOut": bytes_out,
+            "ColdStart": int(was_cold),
+            "S3Operations": {op: {"calls": n, "ms": round(ms, 3)} for op, (n, ms) in state.s3_ops.items()},
+            "RequestId": getattr(context, "aws_request_id", None),
+            **({"StartupPhases": dict(startup_phases)} if was_cold else {}),
+        }))
+
+# -------------------- REQUEST STATE --------------------
+class RequestState:
+    """What one lambda_handler call has learned about objects, so no endpoint
+    asks S3 the same question twice, plus the S3 calls it made and their timings."""
+
+    def __init__(self):
+        self.objects = {}  # key -> HEAD-shaped response, or None if known missing
+        self.s3_calls = 0
+        self.s3_ms = 0.0  # summed over calls, so parallel fan-out can exceed wall time
+        self.s3_ops = {}  # operation name -> [calls, ms]
+        self._lock = threading.Lock()
+
+    def count_call(self, model=None, context=None, **kwargs):
+        with self._lock:
+            self.s3_calls += 1
+        if context is not None:
+            context["garden_call"] = (model.name if model else "unknown", time.perf_counter())
+
+    def finish_call(self, context=None, **kwargs):
+        operation, started = (context or {}).get("garden_call", (None, None))
+        if started is None:
+            return
+        self.record_call(operation, (time.perf_counter() - started) * 1000)
+
+    def record_call(self, operation, elapsed):
+        with self._lock:
+            self.s3_ms += elapsed
+            totals = self.s3_ops.setdefault(operation, [0, 0.0])
+            totals[0] += 1
+            totals[1] += elapsed
+        if METRICS_HISTOGRAMS:
+            metrics.observe_s3(operation, elapsed)
+
+request_state = RequestState()
+
+def remember(key, head):
+    request_state.objects[key] = head
+
 # -------------------- FRONTEND HTML + JS --------------------
 HTML_PAGE = r"""
 <!DOCTYPE html>
@@ -129,18 +930,27 @@ HTML_PAGE = r"""
       border-right: 2px solid var(--border-color);
     }
     .explorer-header { font-size: 0.9rem; font-weight: 600; padding: 0.5rem 1rem; border-bottom: 2px solid var(--border-color); }
+    .refresh-btn { float: right; cursor: pointer; opacity: 0.6; }
+    .refresh-btn:hover { opacity: 1; }
     .explorer-body { flex: 1; overflow-y: auto; padding: 0.5rem; }
+    /* Rows are absolutely positioned inside the spacer; only the visible ones exist. */
+    .explorer-spacer { position: relative; }
     .secret-item {
+      position: absolute;
+      left: 0;
+      right: 0;
+      height: 52px; /* ROW_HEIGHT in the script includes the 4px gap below */
+      box-sizing: border-box;
+      overflow: hidden;
       background: var(--white);
       border: 1px solid var(--border-color);
       padding: 0.4rem 0.6rem;
       border-radius: 4px;
-      margin-bottom: 0.3rem;
       cursor: pointer;
       transition: background 0.2s;
     }
     .secret-item:hover { background: #f9f9f9; }
-    .secret-key { font-weight: 500; margin-bottom: 0.2rem; }
+    .secret-key { font-weight: 500; margin-bottom: 0.2rem; white-space: nowrap; overflow: hidden; text-overflow: ellipsis; }
     .secret-meta { font-size: 0.75rem; color: var(--muted-text); }
     .editor { flex: 1; display: flex; flex-direction: column; background: var(--color-editor); }
     .editor-header { border-bottom: 2px solid var(--border-color); padding: 0.5rem 1rem; font-size: 0.9rem; font-weight: 600; display: flex; align-items: center; }
@@ -174,6 +984,7 @@ HTML_PAGE = r"""
     }
     .meta-box .updates { margin-top: 0.3rem; padding-left: 1rem; }
     .meta-box .updates li { margin-bottom: 0.15rem; }
+    .meta-box .updates .more-history { cursor: pointer; text-decoration: underline; list-style: none; }
     .masked { color: transparent !important; text-shadow: 0 0 5px rgba(0,0,0,0.5); }
     /* Modal Overlays */
     .modal-overlay {
@@ -304,8 +1115,11 @@ HTML_PAGE = r"""
   <!-- Main Layout -->
   <div class="main-container">
     <div class="explorer">
-      <div class="explorer-header">SECRETS</div>
-      <div class="explorer-body" id="explorerBody"></div>
+      <div class="explorer-header">SECRETS <i class="fas fa-sync-alt refresh-btn" id="refreshBtn" title="Refresh list"></i></div>
+      <div class="explorer-body" id="explorerBody">
+        <p id="explorerEmpty" style="display: none; color: var(--muted-text);">No secrets found</p>
+        <div class="explorer-spacer" id="explorerSpacer"></div>
+      </div>
     </div>
     <div class="editor">
       <div class="editor-header">
@@ -371,9 +1185,26 @@ HTML_PAGE = r"""
 
   <script>
     let secretsCache = [];
+    let searchIndex = [];  // lowercase keys, parallel to secretsCache
+    let listComplete = false;
+    let searchSeq = 0;
+    let searchTimer = null;
+    let shownSecrets = [];  // what the explorer is currently showing
+    let rowPool = [];
+    let rowsQueued = false;
+    const ROW_HEIGHT = 56;
+    const ROW_OVERSCAN = 8;
+    const SEARCH_DEBOUNCE_MS = 150;
+    const dateFormat = new Intl.DateTimeFormat();
+    const RESYNC_MS = 5 * 60 * 1000;
     let currentKey = null;
+    let currentEtag = null;
+    let currentBinary = false;
     let isMasked = false;
     let authHeader = "";
+    let currentUser = "";
+    let sessionTimer = null;
+    const LIST_PAGE_SIZE = 500;
 
     document.addEventListener("DOMContentLoaded", () => {
       showModal("loginModal");
@@ -383,8 +1214,29 @@ HTML_PAGE = r"""
       document.getElementById("deleteBtn").addEventListener("click", deleteSecret);
       document.getElementById("copyArnBtn").addEventListener("click", copyArn);
       document.getElementById("maskBtn").addEventListener("click", toggleMaskMode);
-      document.getElementById("saveBtn").addEventListener("click", saveSecret);
-      document.getElementById("searchInput").addEventListener("input", e => renderSecrets(e.target.value));
+      document.getElementById("saveBtn").addEventListener("click", () => saveSecret());
+      document.getElementById("searchInput").addEventListener("input", e => {
+        clearTimeout(searchTimer);
+        searchTimer = setTimeout(() => {
+          document.getElementById("explorerBody").scrollTop = 0;
+          renderSecrets(e.target.value);
+        }, SEARCH_DEBOUNCE_MS);
+      });
+      const explorer = document.getElementById("explorerBody");
+      explorer.addEventListener("scroll", queueRows, { passive: true });
+      explorer.addEventListener("click", e => {
+        const row = e.target.closest(".secret-item");
+        if(row) openSecret(shownSecrets[Number(row.dataset.index)].Key);
+      });
+      window.addEventListener("resize", queueRows);
+      document.getElementById("refreshBtn").addEventListener("click", async () => {
+        try { await refreshList(null, true); showToast("Secrets refreshed", "success"); }
+        catch(err) { showToast("Refresh failed: " + err.message, "error"); }
+      });
+      // Writes patch the explorer in place; this catches changes made by other people.
+      setInterval(() => {
+        if(authHeader && listComplete && !document.hidden) refreshList(null, true).catch(() => {});
+      }, RESYNC_MS);
     });
 
     async function attemptLogin() {
@@ -394,20 +1246,44 @@ HTML_PAGE = r"""
         showToast("Username & password required.", "error");
         return;
       }
-      const token = btoa(`${user}:${pass}`);
-      authHeader = "Basic " + token;
       try {
-        const res = await fetch("/list", { headers: { "Authorization": authHeader } });
-        if(!res.ok) throw new Error("Invalid credentials");
-        secretsCache = await res.json();
-        hideModal("loginModal");
-        showToast("Login successful!", "success");
-        renderSecrets();
+        // The password is sent once; every later request carries the session token.
+        const res = await fetch("/login", {
+          method: "POST",
+          headers: { "Authorization": "Basic " + btoa(`${user}:${pass}`) }
+        });
+        if(res.status===401) throw new Error("Invalid credentials");
+        if(!res.ok) throw new Error(await res.text());
+        startSession(await res.json());
+        document.getElementById("loginPass").value = "";
+        await refreshList(() => {
+          hideModal("loginModal");
+          showToast("Login successful!", "success");
+        });
       } catch(err) {
         showToast("Login failed: " + err.message, "error");
       }
     }
 
+    // Renews the token shortly before it expires; if that fails, ask for the password again.
+    function startSession(session) {
+      authHeader = "Bearer " + session.token;
+      currentUser = session.user;
+      clearTimeout(sessionTimer);
+      const renewIn = Math.max(10, (session.expires - Date.now() / 1000) * 0.8) * 1000;
+      sessionTimer = setTimeout(async () => {
+        try {
+          const res = await fetch("/login", { method: "POST", headers: { "Authorization": authHeader } });
+          if(!res.ok) throw new Error(await res.text());
+          startSession(await res.json());
+        } catch(err) {
+          authHeader = "";
+          showModal("loginModal");
+          showToast("Session expired, please log in again", "error");
+        }
+      }, renewIn);
+    }
+
     function showModal(id) { document.getElementById(id).classList.add("active"); }
     function hideModal(id) { document.getElementById(id).classList.remove("active"); }
     function showToast(msg, type="success") {
@@ -419,56 +1295,181 @@ HTML_PAGE = r"""
       setTimeout(() => { toast.style.opacity = "0"; setTimeout(() => container.removeChild(toast),300); }, 3000);
     }
     async function renderSecrets(query="") {
+      // Until every /list page has arrived, ask the server so matches are not limited to what is loaded.
+      if(query && !listComplete) {
+        const seq = ++searchSeq;
+        try {
+          const r = await fetch("/search?limit=" + LIST_PAGE_SIZE + "&q=" + encodeURIComponent(query),
+                                { cache: "no-cache", headers: { "Authorization": authHeader } });
+          if(!r.ok) throw new Error(await r.text());
+          const found = (await r.json()).results;
+          if(seq===searchSeq && !listComplete) drawSecrets(found);
+          return;
+        } catch(err) {
+          // Fall back to filtering what has been loaded so far.
+        }
+      }
+      const q = query.toLowerCase();
+      if(!q) { drawSecrets(secretsCache); return; }
+      const matches = [];
+      for(let i = 0; i < searchIndex.length; i++) {
+        if(searchIndex[i].includes(q)) matches.push(secretsCache[i]);
+      }
+      drawSecrets(matches);
+    }
+    // The explorer is virtualized: the spacer is as tall as the whole list, and a small
+    // pool of row nodes is moved and relabelled to cover whatever is scrolled into view.
+    function drawSecrets(items) {
+      shownSecrets = items;
+      document.getElementById("explorerSpacer").style.height = (items.length * ROW_HEIGHT) + "px";
+      document.getElementById("explorerEmpty").style.display = items.length ? "none" : "block";
+      renderRows();
+    }
+    function queueRows() {
+      if(rowsQueued) return;
+      rowsQueued = true;
+      requestAnimationFrame(() => { rowsQueued = false; renderRows(); });
+    }
+    function renderRows() {
       const explorer = document.getElementById("explorerBody");
-      explorer.innerHTML = "";
-      let filtered = secretsCache.filter(s => s.Key.toLowerCase().includes(query.toLowerCase()));
-      if(filtered.length===0){
-        explorer.innerHTML = "<p style='color: var(--muted-text);'>No secrets found</p>";
-        return;
+      const spacer = document.getElementById("explorerSpacer");
+      const first = Math.max(0, Math.floor(explorer.scrollTop / ROW_HEIGHT) - ROW_OVERSCAN);
+      const last = Math.min(shownSecrets.length, first + Math.ceil(explorer.clientHeight / ROW_HEIGHT) + 2 * ROW_OVERSCAN);
+      while(rowPool.length < last - first) {
+        const row = document.createElement("div");
+        row.className = "secret-item";
+        const keyDiv = document.createElement("div");
+        keyDiv.className = "secret-key";
+        const metaDiv = document.createElement("div");
+        metaDiv.className = "secret-meta";
+        row.append(keyDiv, metaDiv);
+        spacer.appendChild(row);
+        rowPool.push(row);
       }
-      filtered.forEach(obj => {
-        const date = new Date(obj.LastModified).toLocaleDateString();
-        const div = document.createElement("div");
-        div.className = "secret-item";
-        div.innerHTML = `<div class="secret-key">${obj.Key}</div>
-                         <div class="secret-meta">${date} | ${obj.Size} bytes</div>`;
-        div.addEventListener("click", () => openSecret(obj.Key));
-        explorer.appendChild(div);
+      rowPool.forEach((row, n) => {
+        const i = first + n;
+        if(i >= last) { row.style.display = "none"; row.item = null; return; }
+        const obj = shownSecrets[i];
+        row.style.display = "";
+        row.style.transform = `translateY(${i * ROW_HEIGHT}px)`;
+        row.dataset.index = i;
+        if(row.item !== obj) {
+          row.item = obj;
+          row.firstChild.textContent = obj.Key;
+          row.lastChild.textContent = `${dateFormat.format(new Date(obj.LastModified))} | ${obj.Size} bytes`;
+        }
       });
     }
-    async function refreshList() {
-      const r = await fetch("/list", { headers: { "Authorization": authHeader } });
-      secretsCache = await r.json();
-      renderSecrets();
+    // Pages through /list so the first screen renders before the whole garden is loaded.
+    // A background refresh keeps showing the current list until the new one is complete.
+    // GETs use cache:"no-cache": the browser revalidates with If-None-Match and reuses its copy on 304.
+    async function refreshList(onFirstPage, background=false) {
+      let cursor = "";
+      let loaded = [];
+      let loadedIndex = [];
+      if(!background) listComplete = false;
+      do {
+        let url = "/list?limit=" + LIST_PAGE_SIZE;
+        if(cursor) url += "&cursor=" + encodeURIComponent(cursor);
+        const r = await fetch(url, { cache: "no-cache", headers: { "Authorization": authHeader } });
+        if(r.status===401) throw new Error("Invalid credentials");
+        if(!r.ok) throw new Error(await r.text());
+        const page = await r.json();
+        page.forEach(s => { loaded.push(s); loadedIndex.push(s.Key.toLowerCase()); });
+        cursor = r.headers.get("X-Next-Cursor") || "";
+        if(onFirstPage) { onFirstPage(); onFirstPage = null; }
+        if(background && cursor) continue;
+        secretsCache = loaded;
+        searchIndex = loadedIndex;
+        listComplete = !cursor;
+        renderSecrets(document.getElementById("searchInput").value);
+      } while(cursor);
+    }
+    // Mutations answer with {entry, removed}; patch secretsCache (kept sorted by key) to match.
+    function secretPosition(key) {
+      let lo = 0, hi = secretsCache.length;
+      while(lo < hi) {
+        const mid = (lo + hi) >> 1;
+        if(secretsCache[mid].Key < key) lo = mid + 1; else hi = mid;
+      }
+      return lo;
+    }
+    function applyMutation(result) {
+      if(result.removed) {
+        const i = secretPosition(result.removed);
+        if(secretsCache[i] && secretsCache[i].Key===result.removed) {
+          secretsCache.splice(i, 1);
+          searchIndex.splice(i, 1);
+        }
+      }
+      if(result.entry) {
+        const i = secretPosition(result.entry.Key);
+        if(secretsCache[i] && secretsCache[i].Key===result.entry.Key) {
+          secretsCache[i] = result.entry;
+        } else {
+          secretsCache.splice(i, 0, result.entry);
+          searchIndex.splice(i, 0, result.entry.Key.toLowerCase());
+        }
+      }
+      renderSecrets(document.getElementById("searchInput").value);
+    }
+    function noteHistory(action) {
+      appendHistory(currentKey, [{ time: new Date().toISOString(), user: currentUser, action }], null);
     }
     async function openSecret(key) {
       try {
-        const [contentRes, metaRes] = await Promise.all([
-          fetch("/get?key=" + encodeURIComponent(key), { headers: { "Authorization": authHeader } }),
-          fetch("/meta?key=" + encodeURIComponent(key), { headers: { "Authorization": authHeader } })
+        const [contentRes, metaRes, historyRes] = await Promise.all([
+          fetch("/get?key=" + encodeURIComponent(key), { cache: "no-cache", headers: { "Authorization": authHeader } }),
+          fetch("/meta?key=" + encodeURIComponent(key), { cache: "no-cache", headers: { "Authorization": authHeader } }),
+          fetch("/history?key=" + encodeURIComponent(key), { cache: "no-cache", headers: { "Authorization": authHeader } })
         ]);
         if(!contentRes.ok) throw new Error(await contentRes.text());
         if(!metaRes.ok) throw new Error(await metaRes.text());
-        const content = await contentRes.text();
+        if(!historyRes.ok) throw new Error(await historyRes.text());
+        // Binary secrets (keystores, archives...) arrive as octet-stream and are shown read-only.
+        const binary = (contentRes.headers.get("Content-Type") || "").startsWith("application/octet-stream");
+        const content = binary ? null : await contentRes.text();
+        const size = binary ? (await contentRes.arrayBuffer()).byteLength : 0;
         const meta = await metaRes.json();
         currentKey = key;
+        currentEtag = contentRes.headers.get("ETag");
+        currentBinary = binary;
         document.getElementById("fileLabel").textContent = key;
-        document.getElementById("editorArea").value = content;
+        const editor = document.getElementById("editorArea");
+        editor.value = binary ? `(binary secret, ${size} bytes; use the API to download or replace it)` : content;
+        editor.readOnly = binary;
         isMasked = false;
         updateMaskUI();
         document.getElementById("metaBox").style.display = "block";
         document.getElementById("metaOwner").textContent = "Owner: " + meta.Owner;
-        const updatesUl = document.getElementById("metaUpdates");
-        updatesUl.innerHTML = "";
-        (meta.Updates||[]).forEach(u => {
-          const li = document.createElement("li");
-          li.textContent = `${u.time} | ${u.user} | ${u.action}`;
-          updatesUl.appendChild(li);
-        });
+        document.getElementById("metaUpdates").innerHTML = "";
+        appendHistory(key, await historyRes.json(), historyRes.headers.get("X-Next-Cursor"));
       } catch(err) {
         showToast("Error opening secret: " + err.message, "error");
       }
     }
+    // History comes a page at a time from /history; "Load more" fetches the next page.
+    function appendHistory(key, entries, cursor) {
+      const updatesUl = document.getElementById("metaUpdates");
+      entries.forEach(u => {
+        const li = document.createElement("li");
+        li.textContent = `${u.time} | ${u.user} | ${u.action}`;
+        updatesUl.appendChild(li);
+      });
+      if(!cursor) return;
+      const more = document.createElement("li");
+      more.className = "more-history";
+      more.textContent = "Load more...";
+      more.addEventListener("click", async () => {
+        more.remove();
+        const r = await fetch("/history?key=" + encodeURIComponent(key) + "&cursor=" + encodeURIComponent(cursor), {
+          cache: "no-cache", headers: { "Authorization": authHeader }
+        });
+        if(!r.ok) { showToast("Could not load history: " + await r.text(), "error"); return; }
+        if(currentKey === key) appendHistory(key, await r.json(), r.headers.get("X-Next-Cursor"));
+      });
+      updatesUl.appendChild(more);
+    }
     async function createSecret() {
       const key = document.getElementById("createKey").value.trim();
       const content = document.getElementById("createContent").value;
@@ -481,29 +1482,43 @@ HTML_PAGE = r"""
         });
         if(res.status===409) { showToast("Key already exists", "error"); return; }
         if(!res.ok) throw new Error(await res.text());
+        applyMutation(await res.json());
         showToast("Secret created!", "success");
         hideModal("createModal");
         document.getElementById("createKey").value = "";
         document.getElementById("createContent").value = "";
-        await refreshList();
         confettiMagic();
       } catch(err) {
         showToast("Create failed: "+err.message, "error");
       }
     }
-    async function saveSecret() {
+    async function saveSecret(force=false) {
       if(!currentKey) { showToast("No secret open to save", "error"); return; }
+      if(currentBinary) { showToast("Binary secrets cannot be edited here", "error"); return; }
       const body = document.getElementById("editorArea").value;
+      const headers = { "Authorization": authHeader };
+      // Save only if nobody changed the secret since we opened it.
+      if(currentEtag && !force) headers["If-Match"] = currentEtag;
       try {
         const res = await fetch("/save?key="+encodeURIComponent(currentKey), {
           method: "POST",
-          headers: { "Authorization": authHeader },
+          headers,
           body
         });
+        if(res.status===412) {
+          if(confirm("Someone else changed '" + currentKey + "' since you opened it. Overwrite their changes?")) {
+            await saveSecret(true);
+          } else {
+            showToast("Save cancelled; reopen the secret to see the latest version", "error");
+          }
+          return;
+        }
         if(!res.ok) throw new Error(await res.text());
+        const result = await res.json();
+        currentEtag = result.entry.ETag;
+        applyMutation(result);
+        noteHistory("update");
         showToast("Secret updated!", "success");
-        await refreshList();
-        openSecret(currentKey);
         confettiMagic();
       } catch(err) {
         showToast("Save failed: " + err.message, "error");
@@ -518,12 +1533,13 @@ HTML_PAGE = r"""
           headers: { "Authorization": authHeader }
         });
         if(!res.ok) throw new Error(await res.text());
+        applyMutation(await res.json());
         showToast("Secret deleted!", "success");
         currentKey = null;
+        currentEtag = null;
         document.getElementById("fileLabel").textContent = "No secret selected";
         document.getElementById("editorArea").value = "";
         document.getElementById("metaBox").style.display = "none";
-        await refreshList();
         confettiMagic();
       } catch(err) {
         showToast("Delete failed: " + err.message, "error");
@@ -541,17 +1557,22 @@ HTML_PAGE = r"""
       if(!newK) { showToast("New key is required", "error"); return; }
       if(oldK===newK) { showToast("New key same as old key", "error"); return; }
       try {
-        const check = await fetch("/exists?key="+encodeURIComponent(newK), { headers: { "Authorization": authHeader } });
-        if(check.ok) { showToast("New key already exists", "error"); return; }
         const renameReq = await fetch(`/rename?oldKey=${encodeURIComponent(oldK)}&newKey=${encodeURIComponent(newK)}`, {
           method: "POST",
           headers: { "Authorization": authHeader }
         });
+        if(renameReq.status===409) { showToast("New key already exists", "error"); return; }
         if(!renameReq.ok) throw new Error(await renameReq.text());
+        const result = await renameReq.json();
+        applyMutation(result);
+        if(currentKey===oldK) {
+          currentKey = newK;
+          currentEtag = result.entry.ETag;
+          document.getElementById("fileLabel").textContent = newK;
+          noteHistory(`rename to ${newK}`);
+        }
         showToast(`Renamed ${oldK} -> ${newK}`, "success");
         hideModal("renameModal");
-        await refreshList();
-        openSecret(newK);
         confettiMagic();
       } catch(err) {
         showToast("Rename failed: "+err.message, "error");
@@ -596,21 +1617,174 @@ HTML_PAGE = r"""
 </html>
 """
 
-# Replace placeholder bucket name with the actual bucket name from the environment.
-HTML_PAGE = HTML_PAGE.replace("REPLACE_WITH_YOUR_BUCKET", S3_BUCKET)
+# How long browsers may reuse the page before revalidating it with its ETag.
+UI_MAX_AGE = 3600
+
+def build_static_page(html):
+    """Encode the page once per container: identity, gzip and (if available)
+    brotli variants, each with its own strong ETag derived from the content."""
+    raw = html.encode("utf-8")
+    digest = hashlib.sha256(raw).hexdigest()[:32]
+    variants = {None: {"etag": f'"{digest}"', "body": html, "base64": False}}
+    compressed = {"gzip": gzip.compress(raw, compresslevel=9, mtime=0)}
+    if brotli is not None:
+        compressed["br"] = brotli.compress(raw, quality=11)
+    for encoding, data in compressed.items():
+        variants[encoding] = {
+            "etag": f'"{digest}-{encoding}"',
+            "body": base64.b64encode(data).decode("ascii"),
+            "base64": True,
+        }
+    return variants
+
+_ui_page = None
+
+def ui_page():
+    """The encoded UI, built on the first GET / rather than at import (the
+    brotli pass alone is a noticeable share of a cold start)."""
+    global _ui_page
+    if _ui_page is None:
+        started = time.perf_counter()
+        # Replace placeholder bucket name with the actual bucket name from the environment.
+        _ui_page = build_static_page(HTML_PAGE.replace("REPLACE_WITH_YOUR_BUCKET", S3_BUCKET))
+        startup_phase("ui_page", started)
+    return _ui_page
 
 # -------------------- PYTHON BACKEND --------------------
-def check_auth(event):
-    headers = event.get("headers") or {}
-    auth_header = headers.get("authorization") or headers.get("Authorization")
-    if not auth_header or not auth_header.startswith("Basic "):
+# -------------------- AUTH --------------------
+def hash_password(password, iterations=PBKDF2_ITERATIONS):
+    """A USERS record for `password`:
+    python -c 'import app; print(app.hash_password("s3cret"))'"""
+    salt = os.urandom(16)
+    digest = hashlib.pbkdf2_hmac("sha256", password.encode("utf-8"), salt, iterations)
+    return f"pbkdf2_sha256${iterations}${base64.b64encode(salt).decode()}${base64.b64encode(digest).decode()}"
+
+# Checked against for unknown users, so they take as long to reject as known ones.
+DUMMY_PASSWORD_RECORD = f"pbkdf2_sha256${PBKDF2_ITERATIONS}${'A' * 22}==${'A' * 43}="
+
+def verify_password(password, record):
+    if not record.startswith("pbkdf2_sha256$"):
+        # Plaintext record from before passwords were hashed.
+        return hmac.compare_digest(password.encode("utf-8"), record.encode("utf-8"))
+    _, iterations, salt, expected = record.split("$")
+    digest = hashlib.pbkdf2_hmac("sha256", password.encode("utf-8"), base64.b64decode(salt), int(iterations))
+    return hmac.compare_digest(digest, base64.b64decode(expected))
+
+def record_fingerprint(record):
+    # Carried in session tokens, so changing a password revokes its sessions.
+    return hashlib.sha256(record.encode("utf-8")).hexdigest()[:16]
+
+users_state = {"etag": None, "checked": None}
+
+def refresh_users():
+    """Reload USERS and ADMINS from USERS_OBJECT, at most every USERS_REFRESH_SECONDS."""
+    global USERS, ADMINS
+    checked = users_state["checked"]
+    if not USERS_OBJECT or (checked is not None and time.monotonic() - checked < USERS_REFRESH_SECONDS):
+        return
+    etag = users_state["etag"]
+    try:
+        obj = storage.get_object(Bucket=S3_BUCKET, Key=USERS_OBJECT, **({"IfNoneMatch": etag} if etag else {}))
+    except storage.exceptions.ClientError as e:
+        if etag and e.response.get("Error", {}).get("Code") in ("304", "NotModified"):
+            users_state["checked"] = time.monotonic()
+            return
+        raise
+    data = json.loads(obj["Body"].read())
+    USERS = dict(data.get("users", {}))
+    ADMINS = set(data.get("admins", []))
+    users_state.update(etag=obj["ETag"], checked=time.monotonic())
+
+_session_key = None
+
+def session_key():
+    global _session_key
+    if _session_key is None:
+        if SESSION_SECRET:
+            _session_key = SESSION_SECRET.encode("utf-8")
+            return _session_key
+        if STORAGE_BACKEND == "s3":
+            raise RuntimeError("SESSION_SECRET must be set, e.g. to the output of `openssl rand -base64 32`")
+        for _ in range(2):
+            try:
+                obj = storage.get_object(Bucket=S3_BUCKET, Key=SESSION_KEY_OBJECT)
+                _session_key = base64.b64decode(obj["Body"].read())
+                break
+            except storage.exceptions.NoSuchKey:
+                try:
+                    storage.put_object(
+                        Bucket=S3_BUCKET,
+                        Key=SESSION_KEY_OBJECT,
+                        Body=base64.b64encode(os.urandom(32)),
+                        ServerSideEncryption="AES256",
+                        IfNoneMatch="*"
+                    )
+                except storage.exceptions.ClientError as e:
+                    # Another container created it first; read theirs.
+                    if not is_precondition_error(e):
+                        raise
+        else:
+            raise RuntimeError("could not load the session key")
+    return _session_key
+
+def b64url(data):
+    return base64.urlsafe_b64encode(data).decode("ascii").rstrip("=")
+
+def token_signature(payload):
+    return b64url(hmac.new(session_key(), payload.encode("ascii"), hashlib.sha256).digest())
+
+def issue_token(user):
+    """(token, expiry epoch seconds) for a user who has just authenticated."""
+    expires = int(time.time()) + SESSION_TTL
+    claims = {"u": user, "exp": expires, "f": record_fingerprint(USERS[user])}
+    payload = b64url(json.dumps(claims, separators=(",", ":")).encode("utf-8"))
+    return f"{payload}.{token_signature(payload)}", expires
+
+def verify_token(token):
+    """The user a session token belongs to, or None if it is forged, expired or revoked."""
+    payload, _, signature = token.partition(".")
+    if not hmac.compare_digest(signature.encode("ascii"), token_signature(payload).encode("ascii")):
+        return None
+    claims = json.loads(base64.urlsafe_b64decode(payload + "=" * (-len(payload) % 4)))
+    record = USERS.get(claims["u"])
+    if claims["exp"] < time.time() or record is None or record_fingerprint(record) != claims["f"]:
+        return None
+    return claims["u"]
+
+# Keyed by an HMAC of the whole header under a per-container key, so the
+# cache never holds anything password-derived that outlives the container.
+verified_credentials = LRUCache(AUTH_CACHE_SIZE, ttl=AUTH_CACHE_TTL)
+AUTH_CACHE_KEY = os.urandom(32)
+
+def check_basic(auth_header):
+    cache_key = hmac.new(AUTH_CACHE_KEY, auth_header.encode("utf-8"), hashlib.sha256).digest()
+    cached = verified_credentials.get(cache_key)
+    if cached is not None and USERS.get(cached[0]) == cached[1]:
+        return True, cached[0]
+    decoded = base64.b64decode(auth_header.split(" ", 1)[1]).decode("utf-8")
+    username, password = decoded.split(":", 1)
+    record = USERS.get(username)
+    if record is None:
+        verify_password(password, DUMMY_PASSWORD_RECORD)
         return False, None
+    if not verify_password(password, record):
+        return False, None
+    verified_credentials.put(cache_key, (username, record))
+    return True, username
+
+def check_auth(event):
+    auth_header = get_header(event, "authorization") or ""
     try:
-        encoded = auth_header.split(" ", 1)[1]
-        decoded = base64.b64decode(encoded).decode("utf-8")
-        username, password = decoded.split(":", 1)
-        if USERS.get(username) == password:
-            return True, username
+        refresh_users()
+    except Exception as e:
+        # Keep serving with the users loaded last time.
+        print(json.dumps({"event": "users_refresh_failed", "error": str(e)}))
+    try:
+        if auth_header.startswith("Bearer "):
+            user = verify_token(auth_header.split(" ", 1)[1])
+            return user is not None, user
+        if auth_header.startswith("Basic "):
+            return check_basic(auth_header)
     except Exception:
         pass
     return False, None
@@ -618,18 +1792,609 @@ def check_auth(event):
 def is_admin(user: str) -> bool:
     return user in ADMINS
 
+def parse_metadata(meta):
+    """(owner, history id) from an object's user metadata; the id is None for
+    secrets that still carry their history inline (see history_id_for)."""
+    return meta.get("owner", ""), meta.get("history") or None
+
+def head_secret(key, memoize=True):
+    """HEAD the object, bypassing and refreshing the cache; returns the response or None.
+
+    Within one request the answer is memoized (and kept current by our own
+    writes); bulk scans pass memoize=False so they don't hold every response.
+    """
+    if key in request_state.objects:
+        return request_state.objects[key]
+    try:
+        head = storage.head_object(Bucket=S3_BUCKET, Key=key)
+        owner, history_id = parse_metadata(head.get("Metadata", {}))
+    except storage.exceptions.ClientError as e:
+        if memoize and e.response.get("Error", {}).get("Code") in ("404", "NoSuchKey"):
+            remember(key, None)
+        return None
+    except Exception:
+        return None
+    metadata_cache.put(key, (owner, history_id, head["ETag"]))
+    if memoize:
+        remember(key, head)
+    return head
+
+def head_metadata(key):
+    """Like head_secret, but returns (owner, history id, etag)."""
+    head = head_secret(key)
+    if head is None:
+        return None, None, None
+    owner, history_id = parse_metadata(head.get("Metadata", {}))
+    return owner, history_id, head["ETag"]
+
 def get_metadata(key):
+    cached = metadata_cache.get(key)
+    owner, history_id, _ = cached if cached is not None else head_metadata(key)
+    return owner, history_id
+
+def fetch_owners(keys):
+    """HEAD every key through the shared pool; returns ({key: owner}, stats)."""
+    start = time.perf_counter()
+    owners = {}
+    for key, head in zip(keys, executor.map(lambda k: head_secret(k, memoize=False), keys)):
+        owners[key] = parse_metadata(head.get("Metadata", {}))[0] if head is not None else None
+    stats = {
+        "calls": len(keys),
+        "ms": round((time.perf_counter() - start) * 1000, 1),
+        "concurrency": min(S3_CONCURRENCY, len(keys)),
+    }
+    return owners, stats
+
+def bounded_map(fn, items, limit):
+    """Like executor.map, but with at most `limit` calls in flight; results keep input order."""
+    items = list(items)
+    if threading.current_thread().name.startswith(EXECUTOR_THREAD_PREFIX):
+        # Already on a worker (e.g. history writes under /import): queueing more
+        # work on the same pool and waiting for it can deadlock, so run inline.
+        return [fn(item) for item in items]
+    results = [None] * len(items)
+    in_flight = {}
+    next_item = 0
+    while next_item < len(items) or in_flight:
+        while next_item < len(items) and len(in_flight) < limit:
+            in_flight[executor.submit(fn, items[next_item])] = next_item
+            next_item += 1
+        done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+        for future in done:
+            results[in_flight.pop(future)] = future.result()
+    return results
+
+# -------------------- OWNER INDEX --------------------
+# Every secret key's owner, last-modified time and size, sharded into one JSON
+# object per owner under .garden/index/. /list reads the caller's shard with
+# one GET instead of HEADing every key, and a write rewrites only its owner's
+# shard, so its cost follows that owner's secrets rather than the bucket's.
+# Writers use conditional puts so concurrent containers don't clobber each
+# other; POST /reindex rebuilds every shard from a full bucket scan.
+def is_internal(key):
+    return key.startswith(INTERNAL_PREFIX)
+
+def secret_pages(page_size=1000, start_after=None):
+    """The bucket's secrets, one list_objects_v2 page at a time, skipping the reserved range."""
+    kwargs = {"Bucket": S3_BUCKET, "MaxKeys": page_size}
+    if start_after:
+        kwargs["StartAfter"] = start_after
+    while True:
+        resp = storage.list_objects_v2(**kwargs)
+        contents = resp.get("Contents", [])
+        yield [o for o in contents if not is_internal(o["Key"])]
+        if not resp.get("IsTruncated"):
+            return
+        if contents and is_internal(contents[-1]["Key"]):
+            kwargs.pop("ContinuationToken", None)
+            kwargs["StartAfter"] = INTERNAL_LIST_AFTER
+        else:
+            kwargs["ContinuationToken"] = resp["NextContinuationToken"]
+
+def index_entry(owner, size):
+    """An owner-index row; `size` is the stored (possibly compressed) size, as S3 lists it."""
+    return {"owner": owner, "LastModified": datetime.utcnow().isoformat(timespec="seconds") + "+00:00", "Size": size}
+
+def shard_key(owner):
+    # Owners are free-form strings; this keeps each one a single path segment.
+    return INDEX_SHARD_PREFIX + base64.urlsafe_b64encode(owner.encode("utf-8")).decode("ascii").rstrip("=") + ".json"
+
+def save_shard(owner, secrets, **conditions):
+    return storage.put_object(
+        Bucket=S3_BUCKET,
+        Key=shard_key(owner),
+        Body=json.dumps({"version": 1, "owner": owner, "secrets": secrets}, separators=(",", ":")),
+        ContentType="application/json",
+        ServerSideEncryption="AES256",
+        **conditions
+    )["ETag"]
+
+# The last copy of each shard this container downloaded, by owner, revalidated
+# by ETag on reuse; plus the merged all-owner view that admins list.
+shard_cache = {}
+index_cache = {"etag": None, "secrets": None}
+index_state = {"built": False}
+
+def cached_shard(owner, etag=None):
+    """(secrets, etag) of one owner's shard, or (None, None) if it doesn't
+    exist. A warm container sends If-None-Match and reuses its parsed copy on
+    a 304; if `etag` (e.g. from a listing) matches that copy, no call is made."""
+    cached = shard_cache.get(owner)
+    if cached is not None and etag is not None and cached[0] == etag:
+        return cached[1], cached[0]
+    conditions = {"IfNoneMatch": cached[0]} if cached is not None else {}
     try:
-        head = s3.head_object(Bucket=S3_BUCKET, Key=key)
-        meta = head.get("Metadata", {})
-        owner = meta.get("owner", "")
-        updates_str = meta.get("updates", "[]")
-        updates = json.loads(updates_str)
-        return owner, updates
-    except s3.exceptions.NoSuchKey:
+        obj = storage.get_object(Bucket=S3_BUCKET, Key=shard_key(owner), **conditions)
+    except storage.exceptions.NoSuchKey:
+        shard_cache.pop(owner, None)
         return None, None
-    except Exception:
+    except storage.exceptions.ClientError as e:
+        if cached is not None and e.response.get("Error", {}).get("Code") in ("304", "NotModified"):
+            return cached[1], cached[0]
+        raise
+    secrets = json.loads(obj["Body"].read()).get("secrets", {})
+    shard_cache[owner] = (obj["ETag"], secrets)
+    return secrets, obj["ETag"]
+
+def index_built():
+    """Whether a complete index exists; a shard can be missing just because its owner has no secrets."""
+    if not index_state["built"]:
+        try:
+            storage.head_object(Bucket=S3_BUCKET, Key=INDEX_MARKER_KEY)
+        except storage.exceptions.ClientError as e:
+            if e.response.get("Error", {}).get("Code") not in ("404", "NoSuchKey", "NotFound"):
+                raise
+            return False
+        index_state["built"] = True
+    return True
+
+def list_shards():
+    """{owner: ETag} of every shard, from a LIST of the index prefix."""
+    shards = {}
+    for page in storage.get_paginator("list_objects_v2").paginate(Bucket=S3_BUCKET, Prefix=INDEX_SHARD_PREFIX):
+        for obj in page.get("Contents", []):
+            encoded = obj["Key"][len(INDEX_SHARD_PREFIX):-len(".json")]
+            owner = base64.urlsafe_b64decode(encoded + "=" * (-len(encoded) % 4)).decode("utf-8")
+            shards[owner] = obj["ETag"]
+    return shards
+
+def cached_index(user):
+    """(secrets, etag) of the index rows `user` may see, or (None, None) if
+    there is no index yet. A user's view is their own shard; an admin's is
+    every shard, revalidated with one LIST and a GET per shard that changed."""
+    if not is_admin(user):
+        secrets, etag = cached_shard(user)
+        if secrets is not None:
+            return secrets, etag
+        if not index_built():
+            return None, None
+        return {}, None
+    shards = list_shards()
+    if not shards and not index_built():
         return None, None
+    etag = hashlib.md5(json.dumps(sorted(shards.items())).encode("utf-8")).hexdigest()
+    if index_cache["etag"] == etag:
+        return index_cache["secrets"], etag
+    owners = sorted(shards)
+    secrets = {}
+    for shard, _ in bounded_map(lambda owner: cached_shard(owner, shards[owner]), owners, S3_CONCURRENCY):
+        secrets.update(shard or {})
+    index_cache.update(etag=etag, secrets=secrets)
+    return secrets, etag
+
+def shards_by_owner(secrets):
+    shards = {}
+    for key, entry in secrets.items():
+        shards.setdefault(entry["owner"], {})[key] = entry
+    return shards
+
+def build_index(user):
+    """Scan the bucket into a new index and store it, unless another container
+    got there first; returns the rows `user` may see and the scan stats."""
+    secrets, stats = scan_secrets()
+    shards = shards_by_owner(secrets)
+
+    def save(owner):
+        try:
+            save_shard(owner, shards[owner], IfNoneMatch="*")
+        except storage.exceptions.ClientError as e:
+            # Another container built it first; ours is equally good.
+            if not is_precondition_error(e):
+                raise
+
+    bounded_map(save, list(shards), S3_CONCURRENCY)
+    mark_index_built()
+    if not is_admin(user):
+        secrets = shards.get(user, {})
+    return secrets, stats
+
+def rebuild_index():
+    """POST /reindex: overwrite every shard from a full scan and drop those of
+    owners that no longer have any secrets."""
+    secrets, stats = scan_secrets()
+    shards = shards_by_owner(secrets)
+    bounded_map(lambda owner: save_shard(owner, shards[owner]), list(shards), S3_CONCURRENCY)
+    stale = [shard_key(owner) for owner in list_shards() if owner not in shards]
+    if stale:
+        delete_objects(stale)
+    mark_index_built()
+    shard_cache.clear()
+    return secrets, stats
+
+def mark_index_built():
+    # Written last, so a reader that sees it knows every shard is in place.
+    storage.put_object(Bucket=S3_BUCKET, Key=INDEX_MARKER_KEY, Body=b"", ServerSideEncryption="AES256")
+    index_state["built"] = True
+
+def is_precondition_error(e):
+    return e.response.get("Error", {}).get("Code") in ("PreconditionFailed", "ConditionalRequestConflict")
+
+def update_shard(owner, changes):
+    """Apply {key: entry or None} to one owner's shard, retrying on concurrent
+    writes. Returns the entries it removed, by key."""
+    for attempt in range(INDEX_RETRIES):
+        cached, etag = cached_shard(owner)
+        if cached is None and not index_built():
+            # No index yet; the next /list builds one from a full scan.
+            return {}
+        secrets = dict(cached or {})  # the cached copy is shared with readers
+        removed = {}
+        for key, entry in changes.items():
+            if entry is None:
+                if key in secrets:
+                    removed[key] = secrets.pop(key)
+            else:
+                secrets[key] = entry
+        try:
+            new_etag = save_shard(owner, secrets, **({"IfMatch": etag} if etag else {"IfNoneMatch": "*"}))
+        except storage.exceptions.ClientError as e:
+            if not is_precondition_error(e):
+                raise
+            time.sleep(0.05 * (attempt + 1))
+            continue
+        shard_cache[owner] = (new_etag, secrets)
+        return removed
+    raise RuntimeError("index shard kept changing underneath us")
+
+def update_index(changes, owners):
+    """Apply {key: entry or None} to the index; `owners` names the owner of
+    each removed key, so only the shards involved are touched."""
+    by_owner = {}
+    for key, entry in changes.items():
+        owner = entry["owner"] if entry is not None else owners.get(key)
+        if owner is not None:
+            by_owner.setdefault(owner, {})[key] = entry
+    removed = {}
+    for owner, shard_changes in by_owner.items():
+        removed.update(update_shard(owner, shard_changes))
+    return removed
+
+def sync_index(changes, owners=None):
+    # The secret itself is already written; a stale index is repaired by /reindex.
+    # `owners` names the owner of each removed key, which the index and the
+    # change log both need even when the index is missing or out of date.
+    owners = owners or {}
+    removed = {}
+    try:
+        removed = update_index(changes, owners)
+    except Exception as e:
+        print(json.dumps({"event": "index_update_failed", "keys": list(changes), "error": str(e)}))
+    try:
+        append_changes(changes, owners, removed)
+    except Exception as e:
+        print(json.dumps({"event": "change_log_failed", "keys": list(changes), "error": str(e)}))
+    try:
+        prune_changes()
+    except Exception as e:
+        print(json.dumps({"event": "change_log_prune_failed", "error": str(e)}))
+
+def scan_secrets():
+    """List the whole bucket and HEAD every secret; returns (secrets, stats)."""
+    objects = []
+    for page in secret_pages():
+        objects.extend(page)
+    owners, stats = fetch_owners([o["Key"] for o in objects])
+    secrets = {}
+    for obj in objects:
+        owner = owners[obj["Key"]]
+        if owner is None:
+            continue
+        secrets[obj["Key"]] = {
+            "owner": owner,
+            "LastModified": obj["LastModified"].isoformat(),
+            "Size": obj["Size"]
+        }
+    return secrets, stats
+
+# -------------------- HISTORY --------------------
+# A secret's update history lives outside the secret, as one small JSON object
+# per entry under .garden/history/<history id>/, named so they list in time
+# order. The secret itself only carries the id in its "history" metadata
+# field, so writes and HEADs cost the same however long the history grows.
+# History outlives the secret: deleting a secret leaves its trail behind.
+def history_entry(user, action):
+    return {"user": user, "time": datetime.utcnow().isoformat() + "Z", "action": action}
+
+def history_object_key(history_id, entry):
+    try:
+        stamp = datetime.fromisoformat(entry["time"].rstrip("Z"))
+    except (KeyError, TypeError, AttributeError, ValueError):
+        stamp = datetime.utcnow()
+    return f"{HISTORY_PREFIX}{history_id}/{stamp.strftime('%Y%m%dT%H%M%S%f')}-{uuid.uuid4().hex[:8]}.json"
+
+def append_history(history_id, *entries):
+    """Store entries as new history objects; existing ones are never rewritten."""
+    def put(entry):
+        storage.put_object(
+            Bucket=S3_BUCKET,
+            Key=history_object_key(history_id, entry),
+            Body=json.dumps(entry),
+            ContentType="application/json",
+            ServerSideEncryption="AES256"
+        )
+    bounded_map(put, entries, S3_CONCURRENCY)
+
+def record_history(history_id, entry):
+    # The secret is already written; a missing entry must not fail the request.
+    try:
+        append_history(history_id, entry)
+    except Exception as e:
+        print(json.dumps({"event": "history_append_failed", "history": history_id, "error": str(e)}))
+
+def history_id_for(meta):
+    """The history id for a secret about to be rewritten. Secrets written
+    before the history store keep their whole history in the "updates"
+    metadata field; it is moved into the store here, on their first write."""
+    if meta.get("history"):
+        return meta["history"]
+    history_id = uuid.uuid4().hex
+    legacy = json.loads(meta.get("updates", "[]"))
+    if legacy:
+        append_history(history_id, *legacy)
+    return history_id
+
+def read_history(meta, limit, cursor):
+    """One page of a secret's history, oldest first; returns (entries, next_cursor)."""
+    history_id = meta.get("history")
+    if not history_id:
+        legacy = json.loads(meta.get("updates", "[]"))
+        start = int(cursor.get("offset", 0))
+        return legacy[start:start + limit], ({"offset": start + limit} if start + limit < len(legacy) else None)
+    kwargs = {"Bucket": S3_BUCKET, "Prefix": f"{HISTORY_PREFIX}{history_id}/", "MaxKeys": limit}
+    if "after" in cursor:
+        kwargs["StartAfter"] = cursor["after"]
+    resp = storage.list_objects_v2(**kwargs)
+    keys = [o["Key"] for o in resp.get("Contents", [])]
+    entries = bounded_map(
+        lambda k: json.loads(storage.get_object(Bucket=S3_BUCKET, Key=k)["Body"].read()), keys, S3_CONCURRENCY
+    )
+    next_cursor = {"after": keys[-1]} if resp.get("IsTruncated") and keys else None
+    return entries, next_cursor
+
+def read_full_history(meta):
+    entries, cursor = read_history(meta, 1000, {})
+    while cursor:
+        page, cursor = read_history(meta, 1000, cursor)
+        entries.extend(page)
+    return entries
+
+# -------------------- CHANGE FEED --------------------
+# Every index update is also appended to a change log: one object per update
+# under .garden/changes/, named by time like history entries, mapping each
+# changed key to its new index entry or to a tombstone. /list?since= lists the
+# log from a cursor, so a poll with nothing new costs a single LIST. Records
+# older than CHANGES_RETENTION_HOURS are pruned, so the log stays bounded.
+class ChangesExpired(Exception):
+    """The ?since= position is older than the change log's retention."""
+
+def change_stamp(moment):
+    return f"{CHANGES_PREFIX}{moment.strftime('%Y%m%dT%H%M%S%f')}"
+
+def retention_stamp():
+    return change_stamp(datetime.utcnow() - timedelta(hours=CHANGES_RETENTION_HOURS))
+
+change_log_state = {"pruned": None}
+
+def prune_changes():
+    """Delete one page of expired change records, at most once per CHANGES_PRUNE_INTERVAL."""
+    now = time.monotonic()
+    if change_log_state["pruned"] is not None and now - change_log_state["pruned"] < CHANGES_PRUNE_INTERVAL:
+        return
+    change_log_state["pruned"] = now
+    cutoff = retention_stamp()
+    resp = storage.list_objects_v2(Bucket=S3_BUCKET, Prefix=CHANGES_PREFIX, MaxKeys=1000)
+    expired = [o["Key"] for o in resp.get("Contents", []) if o["Key"] < cutoff]
+    if expired:
+        delete_objects(expired)
+        print(json.dumps({"event": "change_log_pruned", "records": len(expired)}))
+
+def append_changes(changes, owners, removed):
+    """Log {key: entry or None}. Tombstones carry the owner for access checks:
+    the one the caller authorized against, else the removed index entry's."""
+    records = {}
+    for key, entry in changes.items():
+        if entry is None:
+            old = removed.get(key)
+            owner = owners.get(key) or (old["owner"] if old else None)
+            records[key] = {"deleted": True, "owner": owner}
+        else:
+            records[key] = entry
+    storage.put_object(
+        Bucket=S3_BUCKET,
+        Key=f"{change_stamp(datetime.utcnow())}-{uuid.uuid4().hex[:8]}.json",
+        Body=json.dumps({"changes": records}, separators=(",", ":")),
+        ContentType="application/json",
+        ServerSideEncryption="AES256"
+    )
+
+def parse_since(since):
+    """The change-log position for ?since=: "now", an ISO timestamp, or a cursor."""
+    if since == "now":
+        return change_stamp(datetime.utcnow() - timedelta(milliseconds=CHANGES_SETTLE_MS))
+    try:
+        moment = datetime.fromisoformat(since.replace("Z", "+00:00"))
+    except ValueError:
+        after = decode_cursor(since).get("after")
+        if not isinstance(after, str) or not after.startswith(CHANGES_PREFIX):
+            raise ValueError("bad cursor")
+        return after
+    if moment.tzinfo is not None:
+        moment = moment.astimezone(timezone.utc).replace(tzinfo=None)
+    return change_stamp(moment)
+
+def read_changes(user, after):
+    """Keys changed after change-log position `after` that `user` may see,
+    latest state per key; returns (changes, next position, more)."""
+    if after < retention_stamp():
+        raise ChangesExpired()
+    settled = change_stamp(datetime.utcnow() - timedelta(milliseconds=CHANGES_SETTLE_MS))
+    if after >= settled:
+        return [], after, False
+    resp = storage.list_objects_v2(Bucket=S3_BUCKET, Prefix=CHANGES_PREFIX, StartAfter=after, MaxKeys=CHANGES_PAGE_SIZE)
+    contents = resp.get("Contents", [])
+    keys = [o["Key"] for o in contents if o["Key"] < settled]
+    more = bool(resp.get("IsTruncated")) and len(keys) == len(contents)
+    bodies = bounded_map(
+        lambda k: json.loads(storage.get_object(Bucket=S3_BUCKET, Key=k)["Body"].read()), keys, S3_CONCURRENCY
+    )
+    latest = {}
+    for body in bodies:
+        for key, record in body.get("changes", {}).items():
+            latest.pop(key, None)  # re-insert so the order follows each key's last change
+            latest[key] = record
+    changes = []
+    for key, record in latest.items():
+        if not (is_admin(user) or record.get("owner") == user):
+            continue
+        if record.get("deleted"):
+            changes.append({"Key": key, "deleted": True})
+        else:
+            changes.append({**list_entry(key, record), "deleted": False})
+    # Without more to read, every settled record has been seen, so the position
+    # moves up to `settled`. An idle feed's cursor keeps up with the clock
+    # instead of aging out of the retention window.
+    return changes, (keys[-1] if more else settled), more
+
+# -------------------- LIST PAGINATION --------------------
+# Cursors are opaque to clients: {"after": key} when paging through the index,
+# {"token": ContinuationToken} when paging through S3 directly.
+def encode_cursor(state):
+    return base64.urlsafe_b64encode(json.dumps(state).encode("utf-8")).decode("ascii")
+
+def decode_cursor(cursor):
+    state = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+    if not isinstance(state, dict):
+        raise ValueError("bad cursor")
+    return state
+
+def list_entry(key, entry):
+    return {"Key": key, "LastModified": entry["LastModified"], "Size": entry["Size"]}
+
+def mutation_response(status, message, key=None, entry=None, etag=None, removed=None):
+    """JSON reply to a write: the new /list entry for `key` (plus its ETag and
+    owner) and/or the key that left the list, so clients can patch their copy."""
+    body = {"message": message}
+    headers = {"Content-Type": "application/json"}
+    if key is not None:
+        body["entry"] = {**list_entry(key, entry), "ETag": etag, "owner": entry["owner"]}
+        headers["ETag"] = etag
+    if removed is not None:
+        body["removed"] = removed
+    return {"statusCode": status, "headers": headers, "body": json.dumps(body)}
+
+def index_page(secrets, user, limit, after=None):
+    keys = sorted(k for k, e in secrets.items() if is_admin(user) or e["owner"] == user)
+    start = bisect_right(keys, after) if after else 0
+    end = start + limit
+    page = [list_entry(k, secrets[k]) for k in keys[start:end]]
+    next_cursor = {"after": keys[end - 1]} if end < len(keys) else None
+    return page, next_cursor
+
+def scan_page(user, limit, cursor):
+    """One list_objects_v2 page plus its HEAD fan-out, for when there is no index."""
+    kwargs = {"Bucket": S3_BUCKET, "MaxKeys": limit}
+    if "token" in cursor:
+        kwargs["ContinuationToken"] = cursor["token"]
+    elif "after" in cursor:
+        kwargs["StartAfter"] = cursor["after"]
+    resp = storage.list_objects_v2(**kwargs)
+    contents = resp.get("Contents", [])
+    objects = [o for o in contents if not is_internal(o["Key"])]
+    owners, stats = fetch_owners([o["Key"] for o in objects])
+    page = []
+    for obj in objects:
+        owner = owners[obj["Key"]]
+        if owner is not None and (is_admin(user) or owner == user):
+            page.append({
+                "Key": obj["Key"],
+                "LastModified": obj["LastModified"].isoformat(),
+                "Size": obj["Size"]
+            })
+    next_cursor = None
+    if resp.get("IsTruncated"):
+        if contents and is_internal(contents[-1]["Key"]):
+            # This page ran into the reserved range; the next one starts past it.
+            next_cursor = {"after": INTERNAL_LIST_AFTER}
+        else:
+            next_cursor = {"token": resp["NextContinuationToken"]}
+    return page, next_cursor, stats
+
+# -------------------- SEARCH --------------------
+class KeySearch:
+    """One user's searchable view of the owner index. Case-folded keys are kept
+    sorted, so prefix matches are a bisection, and also joined into a single
+    string, so substring matches are str.find calls over one buffer."""
+
+    SEPARATOR = "\x00"  # cannot appear in an S3 key
+
+    def __init__(self, keys):
+        pairs = sorted((key.lower(), key) for key in keys)
+        self.folded = [folded for folded, _ in pairs]
+        self.keys = [key for _, key in pairs]
+        self.text = self.SEPARATOR.join(self.folded)
+        self.starts = []  # offset of each key in self.text
+        offset = 0
+        for folded in self.folded:
+            self.starts.append(offset)
+            offset += len(folded) + 1
+
+    def search(self, query, limit):
+        """Up to `limit` keys containing `query`, prefix matches first, each
+        group in key order; plus whether more matches exist."""
+        query = query.lower()
+        if self.SEPARATOR in query:
+            return [], False
+        found = []
+        seen = set()
+        i = bisect_left(self.folded, query)
+        while i < len(self.folded) and self.folded[i].startswith(query) and len(found) <= limit:
+            found.append(i)
+            seen.add(i)
+            i += 1
+        pos = 0
+        while len(found) <= limit:
+            pos = self.text.find(query, pos)
+            if pos < 0:
+                break
+            i = bisect_right(self.starts, pos) - 1
+            if i not in seen:
+                found.append(i)
+                seen.add(i)
+            # Continue with the next key; one match per key is enough.
+            pos = self.starts[i + 1] if i + 1 < len(self.starts) else len(self.text)
+        return [self.keys[i] for i in found[:limit]], len(found) > limit
+
+search_views = LRUCache(SEARCH_CACHE_SIZE)
+
+def search_view(secrets, etag, user):
+    """The KeySearch over the keys `user` may see, reused while the index ETag is unchanged."""
+    scope = "*" if is_admin(user) else user
+    view = search_views.get((etag, scope)) if etag else None
+    if view is None:
+        view = KeySearch(k for k, e in secrets.items() if scope == "*" or e["owner"] == user)
+        if etag:
+            search_views.put((etag, scope), view)
+    return view
 
 def user_can_access(key, user):
     if is_admin(user):
@@ -639,28 +2404,750 @@ def user_can_access(key, user):
         return False
     return owner == user
 
-def put_object_with_metadata(key, content, owner, updates):
-    updates_str = json.dumps(updates)
-    s3.put_object(
+# -------------------- COMPRESSION --------------------
+TEXT_CONTENT_TYPE = "text/plain; charset=utf-8"
+
+def compress_content(content):
+    """(stored bytes, encoding) for a secret about to be written. Only text is
+    compressed; binary secrets are usually encrypted or compressed already."""
+    if COMPRESSION == "none" or len(content) < COMPRESS_MIN_BYTES:
+        return content, None
+    try:
+        content.decode("utf-8")
+    except UnicodeDecodeError:
+        return content, None
+    # mtime=0 keeps the output, and so the ETag, a function of the content alone.
+    packed = gzip.compress(content, COMPRESS_LEVEL, mtime=0)
+    if len(packed) > len(content) * (1 - COMPRESS_MIN_SAVING):
+        return content, None
+    return packed, "gzip"
+
+def decode_content(body, encoding):
+    """The secret's content from its stored bytes."""
+    if not encoding:
+        return body
+    if encoding == "gzip":
+        return gzip.decompress(body)
+    raise ValueError(f"Unsupported content encoding {encoding!r}")
+
+def stored_size(key):
+    """Stored size of a secret this request just wrote (from the memo, no S3 call)."""
+    return head_secret(key)["ContentLength"]
+
+def put_object_with_metadata(key, content, owner, history_id, **conditions):
+    metadata = {
+        "owner": owner,
+        "history": history_id
+    }
+    if isinstance(content, str):
+        content = content.encode("utf-8")
+    content, encoding = compress_content(content)
+    headers = {}
+    if encoding:
+        metadata["encoding"] = encoding
+        # Standard headers too, so a presigned download (see /get) decodes itself.
+        headers = {"ContentEncoding": encoding, "ContentType": TEXT_CONTENT_TYPE}
+    if len(content) > MULTIPART_WRITE_THRESHOLD:
+        etag = put_multipart(key, content, metadata, headers, **conditions)
+    else:
+        etag = storage.put_object(
+            Bucket=S3_BUCKET,
+            Key=key,
+            Body=content,
+            ServerSideEncryption="AES256",
+            Metadata=metadata,
+            **headers,
+            **conditions
+        )["ETag"]
+    metadata_cache.put(key, (owner, history_id, etag))
+    content_cache.invalidate(key)
+    remember(key, {"Metadata": metadata, "ETag": etag, "ContentLength": len(content), **headers})
+    return etag
+
+def put_multipart(key, content, metadata, headers, **conditions):
+    """Upload a large secret in parts. The preconditions apply when the upload
+    completes, so a conflicting write still fails with 412 and leaves nothing behind."""
+    writer = MultipartWriter(
+        key,
+        headers.get("ContentType", "application/octet-stream"),
+        metadata,
+        MULTIPART_WRITE_THRESHOLD,
+        headers.get("ContentEncoding")
+    )
+    try:
+        view = memoryview(content)
+        for offset in range(0, len(view), MULTIPART_WRITE_THRESHOLD):
+            writer.write(view[offset:offset + MULTIPART_WRITE_THRESHOLD])
+        return writer.close(**conditions)["ETag"]
+    except Exception:
+        writer.abort()
+        raise
+
+def delete_object(key):
+    storage.delete_object(Bucket=S3_BUCKET, Key=key)
+    metadata_cache.invalidate(key)
+    content_cache.invalidate(key)
+    remember(key, None)
+
+def delete_objects(keys):
+    """Batch delete (up to 1000 keys); returns {key: error} for the ones that failed."""
+    if not keys:
+        return {}
+    resp = storage.delete_objects(
+        Bucket=S3_BUCKET,
+        Delete={"Objects": [{"Key": k} for k in keys], "Quiet": True}
+    )
+    for key in keys:
+        metadata_cache.invalidate(key)
+        content_cache.invalidate(key)
+        request_state.objects.pop(key, None)
+    return {e["Key"]: e.get("Message", e.get("Code", "")) for e in resp.get("Errors", [])}
+
+def copy_secret(head, old_key, new_key, user):
+    """Server-side copy of old_key to new_key, recording the rename in its
+    history. The body never passes through Lambda. Fails with a precondition
+    error if new_key already exists. Returns the new key's index entry."""
+    meta = head.get("Metadata", {})
+    owner = meta.get("owner", user)
+    history_id = history_id_for(meta)
+    metadata = {"owner": owner, "history": history_id}
+    headers = {}
+    if meta.get("encoding"):
+        # REPLACE drops whatever is not restated; a compressed body must stay marked.
+        metadata["encoding"] = meta["encoding"]
+        headers = {"ContentEncoding": head.get("ContentEncoding", meta["encoding"]), "ContentType": TEXT_CONTENT_TYPE}
+    resp = storage.copy_object(
         Bucket=S3_BUCKET,
-        Key=key,
-        Body=content,
+        Key=new_key,
+        CopySource={"Bucket": S3_BUCKET, "Key": old_key},
+        MetadataDirective="REPLACE",
+        Metadata=metadata,
         ServerSideEncryption="AES256",
-        Metadata={
-            "owner": owner,
-            "updates": updates_str
-        }
+        IfNoneMatch="*",
+        **headers
     )
+    record_history(history_id, history_entry(user, f"rename to {new_key}"))
+    etag = resp["CopyObjectResult"]["ETag"]
+    metadata_cache.put(new_key, (owner, history_id, etag))
+    content_cache.invalidate(new_key)
+    remember(new_key, {"Metadata": metadata, "ETag": etag, "ContentLength": head["ContentLength"]})
+    return index_entry(owner, size=head["ContentLength"])
+
+def read_secret(key, client_etag=None):
+    """Return (body, etag, encoding) for a secret; a cached copy costs a 304 instead of a full GET.
+
+    The body is returned as stored: `encoding` is "gzip" for a compressed
+    secret (see decode_content) and None otherwise. When nothing is cached but
+    the client already holds `client_etag`, S3 is asked with that ETag and an
+    unchanged secret comes back as (None, etag, None).
+    """
+    global content_not_modified
+    cached = content_cache.get(key)
+    if cached is not None:
+        conditions = {"IfNoneMatch": cached[0]}
+    elif client_etag:
+        conditions = {"IfNoneMatch": client_etag}
+    else:
+        conditions = {}
+    try:
+        obj = storage.get_object(Bucket=S3_BUCKET, Key=key, **conditions)
+    except storage.exceptions.ClientError as e:
+        if conditions and e.response.get("Error", {}).get("Code") in ("304", "NotModified"):
+            content_not_modified += 1
+            if cached is not None:
+                return cached[1], cached[0], cached[2]
+            return None, client_etag, None
+        raise
+    # A full GET carries the same metadata a HEAD would; later access
+    # checks in this request are answered from it.
+    head = {k: v for k, v in obj.items() if k != "Body"}
+    remember(key, head)
+    metadata_cache.put(key, (*parse_metadata(obj.get("Metadata", {})), obj["ETag"]))
+    if obj["ContentLength"] > GET_INLINE_MAX_BYTES:
+        # Only the headers were read; never buffer a body this size.
+        obj["Body"].close()
+        raise SecretTooLarge(obj["ContentLength"], obj["ETag"], obj.get("VersionId"))
+    body = obj["Body"].read()
+    encoding = obj.get("Metadata", {}).get("encoding")
+    content_cache.put(key, (obj["ETag"], body, encoding))
+    return body, obj["ETag"], encoding
+
+class SecretTooLarge(Exception):
+    """Raised by read_secret for secrets over GET_INLINE_MAX_BYTES."""
+
+    def __init__(self, size, etag, version_id=None):
+        super().__init__(f"Secret is {size} bytes; read it with a Range request")
+        self.size = size
+        self.etag = etag
+        self.version_id = version_id
+
+def parse_range(header):
+    """A single "bytes=" range from a Range header, normalized for S3 and
+    clamped to GET_INLINE_MAX_BYTES; None when absent or unsupported."""
+    if not header or not header.startswith("bytes=") or "," in header:
+        return None
+    start, sep, end = header[len("bytes="):].strip().partition("-")
+    if not sep:
+        return None
+    try:
+        if not start:
+            return f"bytes=-{min(int(end), GET_INLINE_MAX_BYTES)}"
+        first = int(start)
+        last = first + GET_INLINE_MAX_BYTES - 1
+        if end:
+            if int(end) < first:
+                return None
+            last = min(int(end), last)
+        return f"bytes={first}-{last}"
+    except ValueError:
+        return None
+
+def read_secret_range(key, byte_range):
+    """Part of a secret; returns the GetObject response with the body already read.
+
+    Returns None for a compressed secret: the range would address the stored
+    bytes rather than the content, so the caller should send it whole.
+    """
+    try:
+        obj = storage.get_object(Bucket=S3_BUCKET, Key=key, Range=byte_range)
+    except storage.exceptions.ClientError as e:
+        if e.response.get("Error", {}).get("Code") != "InvalidRange":
+            raise
+        head = head_secret(key)
+        if head and head.get("Metadata", {}).get("encoding"):
+            return None
+        raise
+    head = {k: v for k, v in obj.items() if k != "Body"}
+    remember(key, head)
+    metadata_cache.put(key, (*parse_metadata(obj.get("Metadata", {})), obj["ETag"]))
+    if obj.get("Metadata", {}).get("encoding"):
+        obj["Body"].close()
+        return None
+    obj["Body"] = obj["Body"].read()
+    return obj
+
+class ByteBudget:
+    """A byte allowance shared by concurrent workers."""
+
+    def __init__(self, limit):
+        self.limit = limit
+        self.used = 0
+        self._lock = threading.Lock()
+
+    def take(self, size):
+        with self._lock:
+            if self.used + size > self.limit:
+                return False
+            self.used += size
+            return True
+
+def batch_read(key, user, budget=None):
+    """One /batch-get entry: {"status": "ok" | "forbidden" | "not_found" | "too_large" | "deferred" | "error", ...}.
+
+    An entry that would take the response past `budget` is "deferred": ask
+    for it again in another request.
+    """
+    if is_internal(key):
+        return {"status": "forbidden"}
+    try:
+        # Read first: a cold read is then one GET whose metadata answers the
+        # access check, instead of a HEAD followed by a GET.
+        body, etag, encoding = read_secret(key)
+        if not user_can_access(key, user):
+            return {"status": "forbidden"}
+        body = decode_content(body, encoding)
+        try:
+            entry = {"status": "ok", "content": body.decode("utf-8"), "etag": etag}
+        except UnicodeDecodeError:
+            entry = {"status": "ok", "content_base64": base64.b64encode(body).decode("ascii"), "etag": etag}
+        if budget is not None and not budget.take(len(json.dumps(entry))):
+            return {"status": "deferred", "size": len(body), "etag": etag}
+        return entry
+    except SecretTooLarge as e:
+        if not user_can_access(key, user):
+            return {"status": "forbidden"}
+        return {"status": "too_large", "size": e.size, "etag": e.etag}
+    except storage.exceptions.NoSuchKey:
+        return {"status": "not_found"}
+    except Exception as e:
+        return {"status": "error", "error": str(e)}
+
+def parse_records(body):
+    """A JSON array or NDJSON stream of records."""
+    body = body.strip()
+    if body.startswith("["):
+        return json.loads(body)
+    return [json.loads(line) for line in body.splitlines() if line.strip()]
+
+def import_record(record, user, overwrite, action="import"):
+    """Write one /import record; returns (result, index entry or None)."""
+    key = record.get("key") if isinstance(record, dict) else None
+    content = record.get("content") if isinstance(record, dict) else None
+    if content is None and isinstance(record, dict) and isinstance(record.get("content_base64"), str):
+        try:
+            content = base64.b64decode(record["content_base64"], validate=True)
+        except ValueError:
+            content = None
+    if not isinstance(key, str) or not key or not isinstance(content, (str, bytes)):
+        return {"key": key, "status": "invalid", "error": "Expected {key, content} strings"}, None
+    if is_internal(key):
+        return {"key": key, "status": "invalid", "error": "Reserved key"}, None
+    # Admins migrating on behalf of others (or restoring an export) may set
+    # the owner and carry over the existing history.
+    owner = user
+    history = []
+    if is_admin(user):
+        owner = record.get("owner") or user
+        if isinstance(record.get("updates"), list):
+            history = record["updates"]
+    try:
+        if overwrite:
+            head = head_secret(key)
+            if head is not None:
+                meta = head.get("Metadata", {})
+                existing_owner = meta.get("owner", "")
+                if not (is_admin(user) or existing_owner == user):
+                    return {"key": key, "status": "forbidden"}, None
+                history_id = history_id_for(meta)
+                put_object_with_metadata(key, content, existing_owner, history_id)
+                record_history(history_id, history_entry(user, action))
+                return {"key": key, "status": "overwritten"}, index_entry(existing_owner, stored_size(key))
+        history_id = uuid.uuid4().hex
+        put_object_with_metadata(key, content, owner, history_id, IfNoneMatch="*")
+        append_history(history_id, *history, history_entry(user, action))
+        return {"key": key, "status": "created"}, index_entry(owner, stored_size(key))
+    except storage.exceptions.ClientError as e:
+        if is_precondition_error(e):
+            return {"key": key, "status": "skipped"}, None
+        return {"key": key, "status": "error", "error": str(e)}, None
+    except Exception as e:
+        return {"key": key, "status": "error", "error": str(e)}, None
+
+class TimeBudget:
+    """When a long job should stop starting new chunks; see IMPORT_TIME_RESERVE_MS."""
+
+    def __init__(self, context):
+        self.context = context
+        self.reserve = 0
+        if context is not None:
+            self.reserve = min(IMPORT_TIME_RESERVE_MS, context.get_remaining_time_in_millis() * IMPORT_TIME_RESERVE_FRACTION)
+        self.longest = 0
+        self.last = None
+
+    def next_chunk(self):
+        """Call before each chunk; False once there is no time for another."""
+        now = time.monotonic()
+        first = self.last is None
+        if not first:
+            self.longest = max(self.longest, (now - self.last) * 1000)
+        self.last = now
+        if first or self.context is None:
+            return True
+        return self.context.get_remaining_time_in_millis() >= self.reserve + self.longest
+
+def run_import(records, user, overwrite, offset=0, context=None, action="import"):
+    """Write an iterable of records in concurrent chunks, one index update per chunk.
+
+    Returns (results, next_offset); next_offset is None once every record has
+    been processed, or the position to resume from if time ran short.
+    """
+    records = iter(records)
+    for _ in islice(records, offset):
+        pass
+    results = []
+    position = offset
+    budget = TimeBudget(context)
+    while True:
+        chunk = list(islice(records, IMPORT_CHUNK_SIZE))
+        if not chunk:
+            return results, None
+        if not budget.next_chunk():
+            return results, position
+        outcomes = bounded_map(lambda r: import_record(r, user, overwrite, action), chunk, S3_CONCURRENCY)
+        results.extend(result for result, _ in outcomes)
+        written = {result["key"]: entry for result, entry in outcomes if entry is not None}
+        if written:
+            sync_index(written)
+        position += len(chunk)
+
+def import_report(results, processed, next_offset):
+    summary = {}
+    for result in results:
+        summary[result["status"]] = summary.get(result["status"], 0) + 1
+    report = {"Processed": processed, "Summary": summary, "Results": results}
+    if next_offset is not None:
+        report["NextOffset"] = next_offset
+    return report
+
+def rename_prefix(old_prefix, new_prefix, user, context=None):
+    """Move every accessible key under old_prefix to new_prefix, a batch at a time:
+    concurrent HEADs and copies, then one DeleteObjects for the batch.
+
+    Keys that fail to copy stay where they are; keys whose old copy could not
+    be deleted are reported but already exist under the new name. Stops early
+    (Complete: false) when the invocation is running out of time; running the
+    same rename again picks up where it left off.
+    """
+    report = {"Moved": 0, "Forbidden": 0, "Failed": [], "Batches": 0, "Complete": True}
+    paginator = storage.get_paginator("list_objects_v2")
+    pages = paginator.paginate(Bucket=S3_BUCKET, Prefix=old_prefix, PaginationConfig={"PageSize": RENAME_BATCH_SIZE})
+    budget = TimeBudget(context)
+    for page in pages:
+        if not budget.next_chunk():
+            report["Complete"] = False
+            break
+        keys = [o["Key"] for o in page.get("Contents", []) if not is_internal(o["Key"])]
+        heads = bounded_map(lambda k: head_secret(k, memoize=False), keys, S3_CONCURRENCY)
+        movable = []
+        for key, head in zip(keys, heads):
+            if head is None:
+                continue
+            # The prefix check alone is not enough: "b/" -> ".garden" turns "b//x" into ".garden/x".
+            if is_internal(new_prefix + key[len(old_prefix):]):
+                report["Failed"].append({"key": key, "error": "Reserved key"})
+                continue
+            owner, _ = parse_metadata(head.get("Metadata", {}))
+            if is_admin(user) or owner == user:
+                movable.append((key, head))
+            else:
+                report["Forbidden"] += 1
+
+        def move(item):
+            key, head = item
+            try:
+                return copy_secret(head, key, new_prefix + key[len(old_prefix):], user), None
+            except storage.exceptions.ClientError as e:
+                return None, "New key already exists" if is_precondition_error(e) else str(e)
+
+        copied = []
+        changes = {}
+        owners = {}
+        for (key, _), (entry, error) in zip(movable, bounded_map(move, movable, S3_CONCURRENCY)):
+            if entry is None:
+                report["Failed"].append({"key": key, "error": error})
+                continue
+            copied.append(key)
+            changes[new_prefix + key[len(old_prefix):]] = entry
+            owners[key] = entry["owner"]  # the copy keeps the owner
+        try:
+            delete_errors = delete_objects(copied)
+        except Exception as e:
+            delete_errors = {key: str(e) for key in copied}
+        for key in copied:
+            if key in delete_errors:
+                report["Failed"].append({"key": key, "error": "Copied, but failed to delete old: " + delete_errors[key]})
+            else:
+                changes[key] = None
+                report["Moved"] += 1
+        if changes:
+            sync_index(changes, owners)
+        report["Batches"] += 1
+        print(json.dumps({"event": "rename_prefix_progress", "from": old_prefix, "to": new_prefix,
+                          "moved": report["Moved"], "failed": len(report["Failed"]), "batches": report["Batches"]}))
+    return report
+
+# -------------------- EXPORT / RESTORE --------------------
+# An export is a gzip-compressed NDJSON archive with one
+# {key, owner, updates, content | content_base64} record per secret, the
+# full history included. It is
+# streamed into S3 with a multipart upload so memory stays at about one part
+# plus one chunk of secrets. /restore feeds the same records back through
+# the /import machinery.
+class MultipartWriter:
+    """File-like writer that uploads to S3 in MULTIPART_PART_SIZE parts and
+    keeps a running SHA-256 of everything written."""
+
+    def __init__(self, key, content_type="application/octet-stream", metadata=None, part_size=MULTIPART_PART_SIZE,
+                 content_encoding=None):
+        self.key = key
+        self.size = 0
+        self.sha256 = hashlib.sha256()
+        self.part_size = part_size
+        self._parts = []
+        self._buffer = bytearray()
+        self._upload_id = storage.create_multipart_upload(
+            Bucket=S3_BUCKET,
+            Key=key,
+            ContentType=content_type,
+            Metadata=metadata or {},
+            ServerSideEncryption="AES256",
+            **({"ContentEncoding": content_encoding} if content_encoding else {})
+        )["UploadId"]
+
+    def write(self, data):
+        self._buffer += data
+        self.sha256.update(data)
+        self.size += len(data)
+        if len(self._buffer) >= self.part_size:
+            self._upload_part()
+
+    def _upload_part(self):
+        number = len(self._parts) + 1
+        resp = storage.upload_part(
+            Bucket=S3_BUCKET,
+            Key=self.key,
+            UploadId=self._upload_id,
+            PartNumber=number,
+            Body=bytes(self._buffer)
+        )
+        self._parts.append({"ETag": resp["ETag"], "PartNumber": number})
+        self._buffer.clear()
+
+    def close(self, **conditions):
+        if self._buffer or not self._parts:
+            self._upload_part()
+        return storage.complete_multipart_upload(
+            Bucket=S3_BUCKET,
+            Key=self.key,
+            UploadId=self._upload_id,
+            MultipartUpload={"Parts": self._parts},
+            **conditions
+        )
+
+    def abort(self):
+        storage.abort_multipart_upload(Bucket=S3_BUCKET, Key=self.key, UploadId=self._upload_id)
+
+def export_record(key):
+    try:
+        obj = storage.get_object(Bucket=S3_BUCKET, Key=key)
+        meta = obj.get("Metadata", {})
+        body = decode_content(obj["Body"].read(), meta.get("encoding"))
+        record = {"key": key, "owner": meta.get("owner", ""), "updates": read_full_history(meta)}
+    except Exception as e:
+        return None, str(e)
+    try:
+        record["content"] = body.decode("utf-8")
+    except UnicodeDecodeError:
+        record["content_base64"] = base64.b64encode(body).decode("ascii")
+    return record, None
+
+def export_chunks(start_after=None):
+    """Lists of keys to read concurrently: at most S3_CONCURRENCY of them and,
+    unless a single secret is bigger, EXPORT_BYTES_IN_FLIGHT stored bytes."""
+    chunk, size = [], 0
+    for page in secret_pages(start_after=start_after):
+        for obj in page:
+            if chunk and (len(chunk) == S3_CONCURRENCY or size + obj["Size"] > EXPORT_BYTES_IN_FLIGHT):
+                yield chunk
+                chunk, size = [], 0
+            chunk.append(obj["Key"])
+            size += obj["Size"]
+    if chunk:
+        yield chunk
+
+def export_garden(archive_key, start_after=None, context=None):
+    """Stream every secret after `start_after` into archive_key; returns the manifest.
+
+    Stops before the invocation runs out of time with a complete archive of
+    what it got through; the manifest's NextStartAfter continues from there."""
+    started = datetime.utcnow().isoformat() + "Z"
+    writer = MultipartWriter(archive_key, "application/gzip")
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)  # wbits=31: gzip container
+    exported = 0
+    errors = []
+    last_key = None
+    next_start_after = None
+    budget = TimeBudget(context)
+    try:
+        for chunk in export_chunks(start_after):
+            if not budget.next_chunk():
+                next_start_after = last_key
+                break
+            for key, (record, error) in zip(chunk, bounded_map(export_record, chunk, S3_CONCURRENCY)):
+                if record is None:
+                    errors.append({"key": key, "error": error})
+                    continue
+                writer.write(compressor.compress(json.dumps(record).encode("utf-8") + b"\n"))
+                exported += 1
+            last_key = chunk[-1]
+        writer.write(compressor.flush())
+        writer.close()
+    except Exception:
+        writer.abort()
+        raise
+    manifest = {
+        "Archive": archive_key,
+        "Format": "ndjson+gzip",
+        "StartAfter": start_after,
+        "Complete": next_start_after is None,
+        "NextStartAfter": next_start_after,
+        "Secrets": exported,
+        "Failed": len(errors),
+        "Errors": errors,
+        "Bytes": writer.size,
+        "SHA256": writer.sha256.hexdigest(),
+        "Started": started,
+        "Finished": datetime.utcnow().isoformat() + "Z",
+    }
+    storage.put_object(
+        Bucket=S3_BUCKET,
+        Key=archive_key + ".manifest.json",
+        Body=json.dumps(manifest),
+        ContentType="application/json",
+        ServerSideEncryption="AES256"
+    )
+    return manifest
+
+def archive_records(body, sha256):
+    """Yield records from a (possibly gzip-compressed) NDJSON archive stream."""
+    decompressor = None
+    pending = b""
+    for position, data in enumerate(body.iter_chunks(1024 * 1024)):
+        sha256.update(data)
+        if position == 0 and data[:2] == b"\x1f\x8b":
+            decompressor = zlib.decompressobj(31)
+        pending += decompressor.decompress(data) if decompressor else data
+        *lines, pending = pending.split(b"\n")
+        for line in lines:
+            if line.strip():
+                yield json.loads(line)
+    if decompressor:
+        pending += decompressor.flush()
+    if pending.strip():
+        yield json.loads(pending)
+
+# -------------------- HTTP CACHING --------------------
+def get_header(event, name):
+    headers = event.get("headers") or {}
+    for k, v in headers.items():
+        if k.lower() == name:
+            return v
+    return None
+
+def parse_etags(header):
+    """The ETags listed in an If-None-Match / If-Match header, weak prefixes dropped."""
+    if not header:
+        return []
+    tags = []
+    for tag in header.split(","):
+        tag = tag.strip()
+        if tag.startswith("W/"):
+            tag = tag[2:]
+        if tag:
+            tags.append(tag)
+    return tags
+
+def encoded_etag(etag, encoding):
+    """The ETag of a secret sent with Content-Encoding `encoding`. Like the
+    static page's variants, each representation has its own: "<etag>-gzip"."""
+    return f'{etag[:-1]}-{encoding}"' if encoding else etag
+
+def stored_etag(tag):
+    """The object ETag behind a representation ETag from encoded_etag."""
+    if tag.endswith('-gzip"'):
+        return tag[:-len('-gzip"')] + '"'
+    return tag
+
+def body_etag(body):
+    return '"' + hashlib.sha256(body.encode("utf-8")).hexdigest()[:32] + '"'
+
+def accepted_encodings(header):
+    encodings = set()
+    for part in (header or "").split(","):
+        name, _, params = part.strip().partition(";")
+        q = params.strip()
+        if q.startswith("q=") and q[2:].strip() in ("0", "0.0", "0.00", "0.000"):
+            continue
+        if name:
+            encodings.add(name.strip().lower())
+    return encodings
+
+def static_response(event, variants, content_type):
+    accepted = accepted_encodings(get_header(event, "accept-encoding"))
+    encoding = next((e for e in ("br", "gzip") if e in variants and e in accepted), None)
+    variant = variants[encoding]
+    headers = {
+        "Content-Type": content_type,
+        "Cache-Control": f"public, max-age={UI_MAX_AGE}",
+        "ETag": variant["etag"],
+        "Vary": "Accept-Encoding",
+    }
+    client_etags = parse_etags(get_header(event, "if-none-match"))
+    for cached in variants.values():
+        if cached["etag"] in client_etags:
+            headers["ETag"] = cached["etag"]
+            return {"statusCode": 304, "headers": headers, "body": ""}
+    if encoding:
+        headers["Content-Encoding"] = encoding
+    return {"statusCode": 200, "headers": headers, "body": variant["body"], "isBase64Encoded": variant["base64"]}
+
+def cacheable_response(event, body, etag, headers=None):
+    """200 with an ETag, or an empty 304 when the client's If-None-Match matches it."""
+    headers = dict(headers or {})
+    headers["ETag"] = etag
+    headers["Cache-Control"] = "private, no-cache"
+    client_etags = parse_etags(get_header(event, "if-none-match"))
+    if etag in client_etags or "*" in client_etags:
+        return {"statusCode": 304, "headers": headers, "body": ""}
+    return {"statusCode": 200, "headers": headers, "body": body}
+
+def request_body(event):
+    """The request body as bytes; Function URLs base64-encode binary payloads."""
+    body = event.get("body") or ""
+    if event.get("isBase64Encoded"):
+        return base64.b64decode(body)
+    return body.encode("utf-8")
+
+def binary_response(status, data, headers=None):
+    return {
+        "statusCode": status,
+        "headers": {"Content-Type": "application/octet-stream", **(headers or {})},
+        "body": base64.b64encode(data).decode("ascii"),
+        "isBase64Encoded": True
+    }
+
+def content_response(event, body, etag, encoding=None, stored_encoding=None):
+    """cacheable_response for secret bytes: as text when they are UTF-8, else base64.
+
+    With `encoding` the body is still compressed and goes out as it is, with
+    Content-Encoding; only text secrets are ever stored compressed. Such a
+    secret (`stored_encoding`) has two representations, each with its own
+    ETag; If-None-Match accepts either, and every response varies on
+    Accept-Encoding.
+    """
+    stored_encoding = stored_encoding or encoding
+    if stored_encoding:
+        client_etags = parse_etags(get_header(event, "if-none-match"))
+        for tag in (etag, encoded_etag(etag, stored_encoding)):
+            if tag in client_etags:
+                headers = {"ETag": tag, "Cache-Control": "private, no-cache", "Vary": "Accept-Encoding"}
+                return {"statusCode": 304, "headers": headers, "body": ""}
+    if encoding:
+        headers = {"Content-Type": TEXT_CONTENT_TYPE, "Content-Encoding": encoding, "Vary": "Accept-Encoding"}
+        response = cacheable_response(event, "", encoded_etag(etag, encoding), headers)
+        if response["statusCode"] == 200:
+            response["body"] = base64.b64encode(body).decode("ascii")
+            response["isBase64Encoded"] = True
+        return response
+    headers = {"Accept-Ranges": "bytes"}
+    if stored_encoding:
+        headers["Vary"] = "Accept-Encoding"
+    try:
+        return cacheable_response(event, body.decode("utf-8"), etag, headers)
+    except UnicodeDecodeError:
+        response = cacheable_response(event, "", etag, {**headers, "Content-Type": "application/octet-stream"})
+        if response["statusCode"] == 200:
+            response["body"] = base64.b64encode(body).decode("ascii")
+            response["isBase64Encoded"] = True
+        return response
 
 def lambda_handler(event, context):
+    global request_state
+    request_state = RequestState()
+    started = time.perf_counter()
+    response = None
+    try:
+        response = handle_request(event, context)
+        response.setdefault("headers", {})["X-S3-Calls"] = str(request_state.s3_calls)
+        return response
+    finally:
+        record_request_metrics(event, context, response, (time.perf_counter() - started) * 1000)
+
+def handle_request(event, context):
     path = event.get("rawPath", "/")
     method = event.get("requestContext", {}).get("http", {}).get("method", "")
     if path == "/" and method == "GET":
-        return {
-            "statusCode": 200,
-            "headers": {"Content-Type": "text/html"},
-            "body": HTML_PAGE
-        }
+        return static_response(event, ui_page(), "text/html; charset=utf-8")
     authorized, current_user = check_auth(event)
     if not authorized:
         return {
@@ -669,150 +3156,479 @@ def lambda_handler(event, context):
             "body": "Unauthorized"
         }
     params = parse_qs(event.get("rawQueryString", ""))
-    if path == "/list" and method == "GET":
+    for name in ("key", "oldKey", "newKey", "oldPrefix", "newPrefix"):
+        if any(is_internal(k) for k in params.get(name, [])):
+            return {"statusCode": 400, "body": f"Keys under '{INTERNAL_PREFIX}' are reserved"}
+    if path == "/login" and method == "POST":
+        # Basic credentials (or a still-valid token) in, fresh session token out.
         try:
-            resp = s3.list_objects_v2(Bucket=S3_BUCKET)
-            contents = resp.get("Contents", [])
-            secrets_info = []
-            for obj in contents:
-                key = obj["Key"]
-                owner, _ = get_metadata(key)
-                if owner is None:
-                    continue
-                if is_admin(current_user) or (owner == current_user):
-                    secrets_info.append({
-                        "Key": key,
-                        "LastModified": obj["LastModified"].isoformat(),
-                        "Size": obj["Size"]
-                    })
-            return {"statusCode": 200, "body": json.dumps(secrets_info)}
+            token, expires = issue_token(current_user)
+        except Exception as e:
+            return {"statusCode": 500, "body": str(e)}
+        return {
+            "statusCode": 200,
+            "headers": {"Content-Type": "application/json", "Cache-Control": "no-store"},
+            "body": json.dumps({"token": token, "expires": expires, "user": current_user, "admin": is_admin(current_user)})
+        }
+    elif path == "/list" and method == "GET" and "since" in params:
+        try:
+            after = parse_since(params["since"][0])
+        except ValueError:
+            return {"statusCode": 400, "body": "Invalid 'since' param"}
+        try:
+            changes, after, more = read_changes(current_user, after)
+        except ChangesExpired:
+            return {"statusCode": 410, "body": "Change log no longer reaches back that far; do a full /list"}
+        except Exception as e:
+            return {"statusCode": 500, "body": str(e)}
+        return {
+            "statusCode": 200,
+            "headers": {"Content-Type": "application/json"},
+            "body": json.dumps({"changes": changes, "cursor": encode_cursor({"after": after}), "more": more})
+        }
+    elif path == "/list" and method == "GET":
+        try:
+            limit = int(params.get("limit", [str(LIST_MAX_LIMIT)])[0])
+            cursor = decode_cursor(params["cursor"][0]) if "cursor" in params else {}
+        except ValueError:
+            return {"statusCode": 400, "body": "Invalid 'limit' or 'cursor' param"}
+        if limit <= 0:
+            return {"statusCode": 400, "body": "Invalid 'limit' or 'cursor' param"}
+        limit = min(limit, LIST_MAX_LIMIT)
+        try:
+            stats = {"calls": 0, "ms": 0}
+            if "token" in cursor:
+                # Finish a scan that started before the index existed.
+                page, next_cursor, stats = scan_page(current_user, limit, cursor)
+            else:
+                secrets, _ = cached_index(current_user)
+                if secrets is None:
+                    secrets, stats = build_index(current_user)
+                page, next_cursor = index_page(secrets, current_user, limit, cursor.get("after"))
+            if stats["calls"]:
+                print(json.dumps({"event": "list_fanout", "user": current_user, **stats}))
+            headers = {
+                "X-Metadata-Calls": str(stats["calls"]),
+                "X-Metadata-Ms": str(stats["ms"]),
+            }
+            if next_cursor:
+                headers["X-Next-Cursor"] = encode_cursor(next_cursor)
+            if params.get("format", [""])[0] == "ndjson":
+                headers["Content-Type"] = "application/x-ndjson"
+                body = "".join(json.dumps(entry) + "\n" for entry in page)
+            else:
+                body = json.dumps(page)
+            return cacheable_response(event, body, body_etag(body), headers)
+        except Exception as e:
+            return {"statusCode": 500, "body": json.dumps({"error": str(e)})}
+    elif path == "/search" and method == "GET":
+        query = params.get("q", [""])[0]
+        if not query:
+            return {"statusCode": 400, "body": "Missing 'q' param"}
+        try:
+            limit = int(params.get("limit", [str(SEARCH_DEFAULT_LIMIT)])[0])
+        except ValueError:
+            return {"statusCode": 400, "body": "Invalid 'limit' param"}
+        if limit <= 0:
+            return {"statusCode": 400, "body": "Invalid 'limit' param"}
+        limit = min(limit, LIST_MAX_LIMIT)
+        try:
+            secrets, etag = cached_index(current_user)
+            if secrets is None:
+                secrets, _ = build_index(current_user)
+            keys, more = search_view(secrets, etag, current_user).search(query, limit)
+            body = json.dumps({"results": [list_entry(k, secrets[k]) for k in keys], "more": more})
+            return cacheable_response(event, body, body_etag(body))
+        except Exception as e:
+            return {"statusCode": 500, "body": str(e)}
+    elif path == "/stats" and method == "GET":
+        if not is_admin(current_user):
+            return {"statusCode": 403, "body": "Forbidden"}
+        return {"statusCode": 200, "body": json.dumps({
+            "metadata_cache": metadata_cache.stats(),
+            "content_cache": {**content_cache.stats(), "not_modified": content_not_modified},
+            "search_views": search_views.stats(),
+            "verified_credentials": verified_credentials.stats(),
+            "requests": metrics.snapshot(),
+            "startup": startup_phases,
+        })}
+    elif path == "/reindex" and method == "POST":
+        if not is_admin(current_user):
+            return {"statusCode": 403, "body": "Forbidden"}
+        try:
+            secrets, stats = rebuild_index()
+            return {"statusCode": 200, "body": json.dumps({"Indexed": len(secrets), **stats})}
         except Exception as e:
             return {"statusCode": 500, "body": json.dumps({"error": str(e)})}
     elif path == "/get" and method == "GET":
         key = params.get("key", [""])[0]
         if not key:
             return {"statusCode": 400, "body": "Missing 'key' param"}
-        if not user_can_access(key, current_user):
-            return {"statusCode": 403, "body": "Forbidden"}
+        client_etags = parse_etags(get_header(event, "if-none-match"))
+        byte_range = parse_range(get_header(event, "range"))
         try:
-            obj = s3.get_object(Bucket=S3_BUCKET, Key=key)
-            content = obj["Body"].read().decode("utf-8")
-            return {"statusCode": 200, "body": content}
-        except s3.exceptions.NoSuchKey:
+            # Read before the access check; see batch_read. Nothing is
+            # returned until the check passes.
+            obj = read_secret_range(key, byte_range) if byte_range else None
+            if obj is not None:
+                if not user_can_access(key, current_user):
+                    return {"statusCode": 403, "body": "Forbidden"}
+                return binary_response(206, obj["Body"], {
+                    "Content-Range": obj["ContentRange"],
+                    "Accept-Ranges": "bytes",
+                    "ETag": obj["ETag"],
+                    "Cache-Control": "private, no-cache",
+                })
+            # No range, or a compressed secret: servers may ignore Range and send it whole.
+            known = stored_etag(client_etags[0]) if len(client_etags) == 1 else None
+            body, etag, encoding = read_secret(key, known)
+            if not user_can_access(key, current_user):
+                return {"statusCode": 403, "body": "Forbidden"}
+            if body is None:
+                # S3 only said the object is unchanged, not whether it is
+                # stored compressed, so vary as if it were.
+                headers = {"ETag": client_etags[0], "Cache-Control": "private, no-cache", "Vary": "Accept-Encoding"}
+                return {"statusCode": 304, "headers": headers, "body": ""}
+            stored_encoding = encoding
+            if encoding and encoding not in accepted_encodings(get_header(event, "accept-encoding")):
+                body, encoding = decode_content(body, encoding), None
+                if len(body) > GET_INLINE_MAX_BYTES:
+                    raise SecretTooLarge(len(body), etag, (request_state.objects.get(key) or {}).get("VersionId"))
+            return content_response(event, body, etag, encoding, stored_encoding)
+        except SecretTooLarge as e:
+            if not user_can_access(key, current_user):
+                return {"statusCode": 403, "body": "Forbidden"}
+            # Too big for a Lambda response: let the client fetch it from S3 directly.
+            if not hasattr(storage, "generate_presigned_url"):
+                return {"statusCode": 413, "headers": {"Accept-Ranges": "bytes", "ETag": e.etag}, "body": str(e)}
+            # Nothing that would become a signed header (like IfMatch): the client
+            # following the redirect won't send it and SigV4 would reject the URL.
+            # On a versioned bucket, VersionId pins the version that was checked.
+            params = {"Bucket": S3_BUCKET, "Key": key}
+            if e.version_id and e.version_id != "null":
+                params["VersionId"] = e.version_id
+            url = storage.generate_presigned_url("get_object", Params=params, ExpiresIn=PRESIGN_TTL)
+            return {"statusCode": 307, "headers": {"Location": url, "ETag": e.etag, "Cache-Control": "no-store"}, "body": ""}
+        except storage.exceptions.NoSuchKey:
+            if not is_admin(current_user):
+                return {"statusCode": 403, "body": "Forbidden"}
             return {"statusCode": 404, "body": "Not found"}
+        except storage.exceptions.ClientError as e:
+            if byte_range and e.response.get("Error", {}).get("Code") == "InvalidRange":
+                return {"statusCode": 416, "body": "Range not satisfiable"}
+            return {"statusCode": 500, "body": str(e)}
         except Exception as e:
             return {"statusCode": 500, "body": str(e)}
+    elif path == "/batch-get" and method == "POST":
+        try:
+            payload = json.loads(request_body(event))
+        except ValueError:
+            return {"statusCode": 400, "body": "Body must be JSON"}
+        keys = payload.get("keys") if isinstance(payload, dict) else payload
+        if not isinstance(keys, list) or not keys or not all(isinstance(k, str) and k for k in keys):
+            return {"statusCode": 400, "body": "Expected a non-empty list of keys"}
+        keys = list(dict.fromkeys(keys))
+        if len(keys) > BATCH_MAX_KEYS:
+            return {"statusCode": 400, "body": f"Too many keys (max {BATCH_MAX_KEYS})"}
+        budget = ByteBudget(BATCH_RESPONSE_BYTES)
+        results = bounded_map(lambda k: batch_read(k, current_user, budget), keys, BATCH_CONCURRENCY)
+        return {
+            "statusCode": 200,
+            "headers": {"Content-Type": "application/json"},
+            "body": json.dumps({"secrets": dict(zip(keys, results))})
+        }
+    elif path == "/import" and method == "POST":
+        mode = params.get("mode", ["skip"])[0]
+        if mode not in ("skip", "overwrite"):
+            return {"statusCode": 400, "body": "'mode' must be 'skip' or 'overwrite'"}
+        try:
+            offset = int(params.get("offset", ["0"])[0])
+            records = parse_records(request_body(event).decode("utf-8"))
+        except ValueError:
+            return {"statusCode": 400, "body": "Body must be a JSON array or NDJSON of {key, content}"}
+        if not isinstance(records, list) or offset < 0:
+            return {"statusCode": 400, "body": "Body must be a JSON array or NDJSON of {key, content}"}
+        results, next_offset = run_import(records, current_user, mode == "overwrite", offset, context)
+        report = import_report(results, next_offset if next_offset is not None else len(records), next_offset)
+        report["Total"] = len(records)
+        return {
+            "statusCode": 200,
+            "headers": {"Content-Type": "application/json"},
+            "body": json.dumps(report)
+        }
+    elif path == "/export" and method == "POST":
+        if not is_admin(current_user):
+            return {"statusCode": 403, "body": "Forbidden"}
+        archive_key = EXPORT_PREFIX + datetime.utcnow().strftime("%Y%m%dT%H%M%SZ") + ".ndjson.gz"
+        start_after = params.get("startAfter", [""])[0] or None
+        try:
+            manifest = export_garden(archive_key, start_after, context)
+        except Exception as e:
+            return {"statusCode": 500, "body": json.dumps({"error": str(e)})}
+        return {
+            "statusCode": 200,
+            "headers": {"Content-Type": "application/json"},
+            "body": json.dumps(manifest)
+        }
+    elif path == "/restore" and method == "POST":
+        if not is_admin(current_user):
+            return {"statusCode": 403, "body": "Forbidden"}
+        archive_key = params.get("archive", [""])[0]
+        mode = params.get("mode", ["skip"])[0]
+        if not archive_key:
+            return {"statusCode": 400, "body": "Missing 'archive' param"}
+        if mode not in ("skip", "overwrite"):
+            return {"statusCode": 400, "body": "'mode' must be 'skip' or 'overwrite'"}
+        try:
+            offset = int(params.get("offset", ["0"])[0])
+        except ValueError:
+            offset = -1
+        if offset < 0:
+            return {"statusCode": 400, "body": "Invalid 'offset' param"}
+        try:
+            obj = storage.get_object(Bucket=S3_BUCKET, Key=archive_key)
+        except storage.exceptions.NoSuchKey:
+            return {"statusCode": 404, "body": "Archive not found"}
+        sha256 = hashlib.sha256()
+        try:
+            records = archive_records(obj["Body"], sha256)
+            results, next_offset = run_import(records, current_user, mode == "overwrite", offset, context, "restore")
+        except Exception as e:
+            return {"statusCode": 500, "body": json.dumps({"error": str(e)})}
+        report = import_report(results, offset + len(results), next_offset)
+        report["Archive"] = archive_key
+        if next_offset is None:
+            report["SHA256"] = sha256.hexdigest()
+            try:
+                manifest = json.loads(storage.get_object(Bucket=S3_BUCKET, Key=archive_key + ".manifest.json")["Body"].read())
+                report["ChecksumVerified"] = manifest.get("SHA256") == report["SHA256"]
+            except storage.exceptions.NoSuchKey:
+                pass
+        return {
+            "statusCode": 200,
+            "headers": {"Content-Type": "application/json"},
+            "body": json.dumps(report)
+        }
     elif path == "/meta" and method == "GET":
         key = params.get("key", [""])[0]
         if not key:
             return {"statusCode": 400, "body": "Missing 'key' param"}
         if not user_can_access(key, current_user):
             return {"statusCode": 403, "body": "Forbidden"}
-        owner, updates = get_metadata(key)
+        owner, _ = get_metadata(key)
         if owner is None:
             return {"statusCode": 404, "body": "Not found"}
-        return {"statusCode": 200, "body": json.dumps({"Owner": owner, "Updates": updates})}
-    elif path == "/create" and method == "POST":
+        body = json.dumps({"Owner": owner})
+        return cacheable_response(event, body, body_etag(body))
+    elif path == "/history" and method == "GET":
         key = params.get("key", [""])[0]
         if not key:
             return {"statusCode": 400, "body": "Missing 'key' param"}
         try:
-            s3.head_object(Bucket=S3_BUCKET, Key=key)
-            return {"statusCode": 409, "body": "Secret key already exists"}
-        except s3.exceptions.ClientError:
-            pass
-        content = event.get("body", "") or ""
-        updates = [{
-            "user": current_user,
-            "time": datetime.utcnow().isoformat() + "Z",
-            "action": "create"
-        }]
+            limit = int(params.get("limit", [str(HISTORY_PAGE_SIZE)])[0])
+            cursor = decode_cursor(params["cursor"][0]) if "cursor" in params else {}
+        except ValueError:
+            return {"statusCode": 400, "body": "Invalid 'limit' or 'cursor' param"}
+        if limit <= 0:
+            return {"statusCode": 400, "body": "Invalid 'limit' or 'cursor' param"}
+        if not user_can_access(key, current_user):
+            return {"statusCode": 403, "body": "Forbidden"}
+        head = head_secret(key)
+        if head is None:
+            return {"statusCode": 404, "body": "Not found"}
         try:
-            put_object_with_metadata(key, content, current_user, updates)
-            return {"statusCode": 201, "body": "Created"}
+            entries, next_cursor = read_history(head.get("Metadata", {}), min(limit, LIST_MAX_LIMIT), cursor)
         except Exception as e:
             return {"statusCode": 500, "body": str(e)}
-    elif path == "/save" and method == "POST":
+        headers = {"X-Next-Cursor": encode_cursor(next_cursor)} if next_cursor else {}
+        body = json.dumps(entries)
+        return cacheable_response(event, body, body_etag(body), headers)
+    elif path == "/create" and method == "POST":
         key = params.get("key", [""])[0]
         if not key:
             return {"statusCode": 400, "body": "Missing 'key' param"}
-        if not user_can_access(key, current_user):
-            return {"statusCode": 403, "body": "Forbidden"}
-        content = event.get("body", "") or ""
+        content = request_body(event)
+        history_id = uuid.uuid4().hex
         try:
-            head = s3.head_object(Bucket=S3_BUCKET, Key=key)
+            # If-None-Match makes the existence check part of the write.
+            etag = put_object_with_metadata(key, content, current_user, history_id, IfNoneMatch="*")
+            record_history(history_id, history_entry(current_user, "create"))
+            entry = index_entry(current_user, stored_size(key))
+            sync_index({key: entry})
+            return mutation_response(201, "Created", key, entry, etag)
+        except storage.exceptions.ClientError as e:
+            if is_precondition_error(e):
+                return {"statusCode": 409, "body": "Secret key already exists"}
+            return {"statusCode": 500, "body": str(e)}
+        except Exception as e:
+            return {"statusCode": 500, "body": str(e)}
+    elif path == "/save" and method == "POST":
+        key = params.get("key", [""])[0]
+        if not key:
+            return {"statusCode": 400, "body": "Missing 'key' param"}
+        content = request_body(event)
+        # With If-Match the write is conditional on the ETag the client
+        # loaded, so a concurrent edit is refused (412) rather than lost.
+        client_etags = parse_etags(get_header(event, "if-match"))
+        # The /get response may have named its gzip representation; the
+        # precondition is on the stored object either way.
+        expected = stored_etag(client_etags[0]) if len(client_etags) == 1 and client_etags[0] != "*" else None
+        cached = metadata_cache.get(key) if expected else None
+        meta = None
+        if cached is not None and cached[2] == expected and cached[1]:
+            # The cached state is exactly the version the client holds, and
+            # S3 enforces the precondition, so no HEAD is needed.
+            owner, history_id = cached[0], cached[1]
+        else:
+            head = head_secret(key)
+            if head is None:
+                if not is_admin(current_user):
+                    return {"statusCode": 403, "body": "Forbidden"}
+                return {"statusCode": 404, "body": "No existing secret to update"}
             meta = head.get("Metadata", {})
-            owner = meta.get("owner", current_user)
-            updates = json.loads(meta.get("updates", "[]"))
-        except s3.exceptions.NoSuchKey:
-            return {"statusCode": 404, "body": "No existing secret to update"}
-        updates.append({
-            "user": current_user,
-            "time": datetime.utcnow().isoformat() + "Z",
-            "action": "update"
-        })
+            owner, history_id = meta.get("owner", current_user), None
+        if not (is_admin(current_user) or owner == current_user):
+            return {"statusCode": 403, "body": "Forbidden"}
+        if meta is not None and expected and head["ETag"] != expected:
+            return {"statusCode": 412, "headers": {"ETag": head["ETag"]}, "body": "Secret was changed since it was loaded"}
         try:
-            put_object_with_metadata(key, content, owner, updates)
-            return {"statusCode": 200, "body": "Updated"}
+            if history_id is None:
+                history_id = history_id_for(meta)
+            conditions = {"IfMatch": expected} if expected else {}
+            etag = put_object_with_metadata(key, content, owner, history_id, **conditions)
+        except storage.exceptions.ClientError as e:
+            if expected and (is_precondition_error(e) or e.response.get("Error", {}).get("Code") in ("404", "NoSuchKey")):
+                metadata_cache.invalidate(key)
+                return {"statusCode": 412, "body": "Secret was changed since it was loaded"}
+            return {"statusCode": 500, "body": str(e)}
         except Exception as e:
             return {"statusCode": 500, "body": str(e)}
+        record_history(history_id, history_entry(current_user, "update"))
+        entry = index_entry(owner, stored_size(key))
+        sync_index({key: entry})
+        return mutation_response(200, "Updated", key, entry, etag)
     elif path == "/delete" and method == "DELETE":
         key = params.get("key", [""])[0]
         if not key:
             return {"statusCode": 400, "body": "Missing 'key' param"}
-        if not user_can_access(key, current_user):
+        # Destructive: authorize from a fresh HEAD, like /save and /rename. The
+        # warm metadata cache may still name a previous owner of this key.
+        head = head_secret(key)
+        if head is None:
+            if not is_admin(current_user):
+                return {"statusCode": 403, "body": "Forbidden"}
+            return {"statusCode": 404, "body": "Not found"}
+        owner, _ = parse_metadata(head.get("Metadata", {}))
+        if not (is_admin(current_user) or owner == current_user):
             return {"statusCode": 403, "body": "Forbidden"}
         try:
-            s3.delete_object(Bucket=S3_BUCKET, Key=key)
-            return {"statusCode": 200, "body": "Deleted"}
+            delete_object(key)
+            sync_index({key: None}, {key: owner})
+            return mutation_response(200, "Deleted", removed=key)
         except Exception as e:
             return {"statusCode": 500, "body": str(e)}
     elif path == "/exists" and method == "GET":
         key = params.get("key", [""])[0]
         if not key:
             return {"statusCode": 400, "body": "Missing 'key' param"}
-        try:
-            s3.head_object(Bucket=S3_BUCKET, Key=key)
-        except s3.exceptions.ClientError:
+        if head_secret(key) is None:
             return {"statusCode": 404, "body": "Key not found"}
         if not user_can_access(key, current_user):
             return {"statusCode": 403, "body": "Forbidden"}
         return {"statusCode": 200, "body": "Key exists"}
     elif path == "/rename" and method == "POST":
+        old_prefix = params.get("oldPrefix", [""])[0]
+        new_prefix = params.get("newPrefix", [""])[0]
+        if old_prefix or new_prefix:
+            if not old_prefix or not new_prefix:
+                return {"statusCode": 400, "body": "Missing 'oldPrefix' or 'newPrefix' param"}
+            if old_prefix.startswith(new_prefix) or new_prefix.startswith(old_prefix):
+                return {"statusCode": 400, "body": "'oldPrefix' and 'newPrefix' must not overlap"}
+            if INTERNAL_PREFIX.startswith(old_prefix):
+                # e.g. "." or ".gar": would sweep up the bookkeeping objects.
+                return {"statusCode": 400, "body": f"Keys under '{INTERNAL_PREFIX}' are reserved"}
+            try:
+                report = rename_prefix(old_prefix, new_prefix, current_user, context)
+            except Exception as e:
+                return {"statusCode": 500, "body": json.dumps({"error": str(e)})}
+            return {
+                "statusCode": 200 if report["Complete"] and not report["Failed"] else 207,
+                "headers": {"Content-Type": "application/json"},
+                "body": json.dumps(report)
+            }
         old_key = params.get("oldKey", [""])[0]
         new_key = params.get("newKey", [""])[0]
         if not old_key or not new_key:
             return {"statusCode": 400, "body": "Missing 'oldKey' or 'newKey' param"}
-        if not user_can_access(old_key, current_user):
-            return {"statusCode": 403, "body": "Forbidden"}
-        try:
-            obj = s3.get_object(Bucket=S3_BUCKET, Key=old_key)
-            old_content = obj["Body"].read()
-            head = s3.head_object(Bucket=S3_BUCKET, Key=old_key)
-            meta = head.get("Metadata", {})
-            owner = meta.get("owner", current_user)
-            updates = json.loads(meta.get("updates", "[]"))
-        except s3.exceptions.NoSuchKey:
+        head = head_secret(old_key)
+        if head is None:
+            if not is_admin(current_user):
+                return {"statusCode": 403, "body": "Forbidden"}
             return {"statusCode": 404, "body": "Old key not found"}
-        except Exception as e:
-            return {"statusCode": 500, "body": str(e)}
-        try:
-            s3.head_object(Bucket=S3_BUCKET, Key=new_key)
-            return {"statusCode": 409, "body": "New key already exists"}
-        except s3.exceptions.ClientError:
-            pass
-        updates.append({
-            "user": current_user,
-            "time": datetime.utcnow().isoformat() + "Z",
-            "action": f"rename to {new_key}"
-        })
+        owner, _ = parse_metadata(head.get("Metadata", {}))
+        if not (is_admin(current_user) or owner == current_user):
+            return {"statusCode": 403, "body": "Forbidden"}
         try:
-            put_object_with_metadata(new_key, old_content, owner, updates)
-        except Exception as e:
+            entry = copy_secret(head, old_key, new_key, current_user)
+        except storage.exceptions.ClientError as e:
+            if is_precondition_error(e):
+                return {"statusCode": 409, "body": "New key already exists"}
             return {"statusCode": 500, "body": f"Failed to create new key: {str(e)}"}
         try:
-            s3.delete_object(Bucket=S3_BUCKET, Key=old_key)
+            delete_object(old_key)
         except Exception as e:
+            sync_index({new_key: entry})
             return {"statusCode": 500, "body": f"New created, but failed to delete old: {str(e)}"}
-        return {"statusCode": 200, "body": "Rename successful"}
+        sync_index({old_key: None, new_key: entry}, {old_key: owner})
+        # copy_secret left the new object's HEAD in the request state.
+        return mutation_response(200, "Rename successful", new_key, entry, head_secret(new_key)["ETag"], removed=old_key)
     return {"statusCode": 404, "body": "Not found"}
+
+# -------------------- LOCAL SERVER --------------------
+# `python app.py [port]` serves the garden over plain HTTP outside Lambda,
+# turning each request into the event a Function URL would send. Meant for
+# STORAGE_BACKEND=sqlite on a laptop or behind a TLS-terminating proxy.
+def serve(host="127.0.0.1", port=8080):
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+    from urllib.parse import urlsplit
+
+    class FunctionURLHandler(BaseHTTPRequestHandler):
+        def handle_one(self):
+            url = urlsplit(self.path)
+            headers = {}
+            for name, value in self.headers.items():
+                name = name.lower()
+                headers[name] = f"{headers[name]},{value}" if name in headers else value
+            body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+            event = {
+                "rawPath": url.path,
+                "rawQueryString": url.query,
+                "headers": headers,
+                "requestContext": {"http": {"method": self.command, "path": url.path, "sourceIp": self.client_address[0]}},
+            }
+            if body:
+                event["body"] = base64.b64encode(body).decode("ascii")
+                event["isBase64Encoded"] = True
+            response = lambda_handler(event, None)
+            data = response.get("body") or ""
+            data = base64.b64decode(data) if response.get("isBase64Encoded") else data.encode("utf-8")
+            self.send_response(response.get("statusCode", 200))
+            for name, value in response.get("headers", {}).items():
+                if name.lower() != "content-length":
+                    self.send_header(name, value)
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            if self.command != "HEAD":
+                self.wfile.write(data)
+
+        do_GET = do_POST = do_PUT = do_DELETE = do_HEAD = handle_one
+
+    print(f"Garden of Secrets on http://{host}:{port}/ ({STORAGE_BACKEND})")
+    ThreadingHTTPServer((host, port), FunctionURLHandler).serve_forever()
+
+startup_phase("module", _phase_started)
+startup_phase("import_total", _import_started)
+
+if __name__ == "__main__":
+    import sys
+    serve(port=int(sys.argv[1]) if len(sys.argv) > 1 else 8080)
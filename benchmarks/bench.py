@@ -0,0 +1,258 @@
+"""Offline benchmark for the Garden of Secrets Lambda.
+
+Drives `app.lambda_handler` with synthetic Function URL events against a local
+moto S3 server, so performance can be measured without deploying. For every
+bucket size it seeds that many secrets, then runs simulated users, each in its
+own process (like separate Lambda containers), through every route. It reports
+latency percentiles and the `X-S3-Calls` count per route as JSON.
+`--storage sqlite` runs the same workload on the SQLite backend instead.
+
+    pip install boto3 "moto[server]"
+    python benchmarks/bench.py --sizes 100,10000 --users 4 --iterations 20 -o before.json
+    python benchmarks/bench.py ... -o after.json --baseline before.json
+    python benchmarks/bench.py ... --storage sqlite -o sqlite.json --baseline before.json
+"""
+import argparse
+import base64
+import json
+import logging
+import multiprocessing
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+ROUTES = ["/list", "/get", "/meta", "/exists", "/create", "/save", "/rename", "/delete"]
+SIM_USERS = ["alice", "bob"]
+PASSWORDS = {"alice": "password1", "bob": "password2"}  # the demo users in app.USERS
+SEED_CONCURRENCY = 32
+KEYS_PER_WORKER = 1000
+
+# -------------------- EVENTS --------------------
+def make_event(app, user, method, path, query="", body=None):
+    """A Lambda Function URL event as the handler receives it."""
+    credentials = base64.b64encode(f"{user}:{PASSWORDS[user]}".encode()).decode()
+    event = {
+        "rawPath": path,
+        "rawQueryString": query,
+        "headers": {"authorization": f"Basic {credentials}"},
+        "requestContext": {"http": {"method": method}},
+        "isBase64Encoded": False,
+    }
+    if body is not None:
+        event["body"] = body
+    return event
+
+def timed_call(app, samples, route, event):
+    """Call the handler once and record (latency ms, S3 calls, status)."""
+    start = time.perf_counter()
+    response = app.lambda_handler(event, None)
+    elapsed = (time.perf_counter() - start) * 1000
+    calls = int(response.get("headers", {}).get("X-S3-Calls", 0))
+    samples.setdefault(route, []).append((elapsed, calls, response["statusCode"]))
+    return response
+
+# -------------------- WORKERS --------------------
+def load_app():
+    """Import the handler in a worker; its log lines go to stderr, away from the report."""
+    sys.stdout = sys.stderr
+    sys.path.insert(0, ROOT)
+    import app
+    return app
+
+def run_user(task):
+    """One simulated user: reads of seeded secrets plus a create/save/rename/delete cycle."""
+    app = load_app()
+
+    worker, user, keys, iterations, warmup, seed = task
+    rng = random.Random(seed)
+    samples = {}
+    for i in range(warmup + iterations):
+        # Warm-up iterations fill the container's caches and are thrown away.
+        if i == warmup:
+            samples = {}
+        key = rng.choice(keys)
+        quoted = f"key={key}"
+        timed_call(app, samples, "/list", make_event(app, user, "GET", "/list"))
+        timed_call(app, samples, "/get", make_event(app, user, "GET", "/get", quoted))
+        timed_call(app, samples, "/meta", make_event(app, user, "GET", "/meta", quoted))
+        timed_call(app, samples, "/exists", make_event(app, user, "GET", "/exists", quoted))
+
+        new_key = f"bench/{worker}/{uuid.uuid4().hex}"
+        renamed = new_key + "-renamed"
+        timed_call(app, samples, "/create", make_event(app, user, "POST", "/create", f"key={new_key}", "v1"))
+        timed_call(app, samples, "/save", make_event(app, user, "POST", "/save", f"key={new_key}", "v2"))
+        timed_call(app, samples, "/rename", make_event(app, user, "POST", "/rename", f"oldKey={new_key}&newKey={renamed}"))
+        timed_call(app, samples, "/delete", make_event(app, user, "DELETE", "/delete", f"key={renamed}"))
+    return samples
+
+def warm_index(user):
+    """Let the app build the owner index once, before any timing starts."""
+    app = load_app()
+    app.lambda_handler(make_event(app, user, "GET", "/list"), None)
+
+def seed_storage(size):
+    """seed_bucket through the app's own storage backend (for --storage sqlite)."""
+    app = load_app()
+    return seed_bucket(app.storage, app.S3_BUCKET, size)
+
+# -------------------- SEEDING --------------------
+def seed_bucket(s3, bucket, size):
+    """Fill `bucket` with `size` secrets spread over the simulated users."""
+    keys = {user: [] for user in SIM_USERS}
+
+    def put(i):
+        user = SIM_USERS[i % len(SIM_USERS)]
+        key = f"team-{i % 10}/secret-{i:06d}"
+        s3.put_object(Bucket=bucket, Key=key, Body=os.urandom(32).hex(), Metadata={"owner": user})
+        return user, key
+
+    with ThreadPoolExecutor(SEED_CONCURRENCY) as pool:
+        for user, key in pool.map(put, range(size)):
+            keys[user].append(key)
+    return keys
+
+# -------------------- REPORTING --------------------
+def percentile(values, pct):
+    """Nearest-rank percentile of an already sorted list."""
+    if not values:
+        return None
+    rank = max(1, -(-len(values) * pct // 100))
+    return values[int(rank) - 1]
+
+def summarize(samples):
+    latencies = sorted(s[0] for s in samples)
+    calls = [s[1] for s in samples]
+    return {
+        "count": len(samples),
+        "errors": sum(1 for s in samples if s[2] >= 400),
+        "p50_ms": round(percentile(latencies, 50), 3),
+        "p90_ms": round(percentile(latencies, 90), 3),
+        "p99_ms": round(percentile(latencies, 99), 3),
+        "max_ms": round(latencies[-1], 3),
+        "mean_ms": round(sum(latencies) / len(latencies), 3),
+        "s3_calls_mean": round(sum(calls) / len(calls), 2),
+        "s3_calls_max": max(calls),
+    }
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def print_table(report, baseline=None):
+    """Human-readable summary on stderr; JSON stays clean on stdout."""
+    for size, routes in report["results"].items():
+        print(f"\n{size} secrets", file=sys.stderr)
+        print(f"  {'route':<9}{'p50 ms':>10}{'p90 ms':>10}{'p99 ms':>10}{'S3 calls':>10}{'errors':>8}", file=sys.stderr)
+        for route, stats in routes.items():
+            line = (f"  {route:<9}{stats['p50_ms']:>10.2f}{stats['p90_ms']:>10.2f}{stats['p99_ms']:>10.2f}"
+                    f"{stats['s3_calls_mean']:>10.2f}{stats['errors']:>8}")
+            before = (baseline or {}).get("results", {}).get(size, {}).get(route)
+            if before:
+                line += f"   p50 x{stats['p50_ms'] / max(before['p50_ms'], 1e-9):.2f}"
+                line += f", calls {before['s3_calls_mean']:.2f} -> {stats['s3_calls_mean']:.2f}"
+            print(line, file=sys.stderr)
+
+# -------------------- MAIN --------------------
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", default="100,10000", help="comma-separated bucket sizes, e.g. 100,10000,100000")
+    parser.add_argument("--users", type=int, default=1, help="concurrent simulated users (processes)")
+    parser.add_argument("--iterations", type=int, default=20, help="timed iterations per user")
+    parser.add_argument("--warmup", type=int, default=1, help="untimed iterations per user")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("-o", "--output", help="write the JSON report here instead of stdout")
+    parser.add_argument("--baseline", help="earlier JSON report to compare against")
+    parser.add_argument("--storage", choices=["s3", "sqlite"], default="s3", help="storage backend to measure")
+    args = parser.parse_args()
+
+    os.environ.setdefault("AWS_ACCESS_KEY_ID", "bench")
+    os.environ.setdefault("AWS_SECRET_ACCESS_KEY", "bench")
+    os.environ.setdefault("AWS_DEFAULT_REGION", "us-east-1")
+    os.environ.setdefault("SESSION_SECRET", "bench")
+    # Keep the workers' per-request metric lines out of the JSON report.
+    os.environ.setdefault("METRICS_EMF", "false")
+    os.environ["STORAGE_BACKEND"] = args.storage
+    workdir = tempfile.TemporaryDirectory()
+
+    server = s3 = None
+    if args.storage == "s3":
+        import boto3
+        from moto.server import ThreadedMotoServer
+
+        logging.getLogger("werkzeug").setLevel(logging.ERROR)
+        server = ThreadedMotoServer(ip_address="127.0.0.1", port=0, verbose=False)
+        server.start()
+        host, port = server.get_host_and_port()
+        # Workers inherit this, so the app's own boto3 client talks to the local server.
+        os.environ["AWS_ENDPOINT_URL"] = f"http://{host}:{port}"
+        s3 = boto3.client("s3")
+
+    report = {
+        "commit": git_commit(),
+        "python": sys.version.split()[0],
+        "started": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "config": {"users": args.users, "iterations": args.iterations, "warmup": args.warmup, "seed": args.seed,
+                   "storage": args.storage},
+        "seed_seconds": {},
+        "results": {},
+    }
+    context = multiprocessing.get_context("spawn")
+    try:
+        for size in (int(s) for s in args.sizes.split(",")):
+            bucket = f"bench-{size}-{uuid.uuid4().hex[:8]}"
+            os.environ["SECRETS_BUCKET"] = bucket
+            # A fresh database per size, shared by every worker like a bucket.
+            os.environ["STORAGE_PATH"] = os.path.join(workdir.name, bucket + ".db")
+            print(f"Seeding {size} secrets into {bucket}...", file=sys.stderr)
+            start = time.perf_counter()
+            if s3 is not None:
+                s3.create_bucket(Bucket=bucket)
+                keys = seed_bucket(s3, bucket, size)
+            else:
+                with context.Pool(1) as pool:
+                    keys = pool.apply(seed_storage, (size,))
+            report["seed_seconds"][str(size)] = round(time.perf_counter() - start, 2)
+
+            tasks = []
+            for worker in range(args.users):
+                user = SIM_USERS[worker % len(SIM_USERS)]
+                owned = keys[user][:KEYS_PER_WORKER] or ["missing"]
+                tasks.append((worker, user, owned, args.iterations, args.warmup, args.seed + worker))
+            with context.Pool(args.users) as pool:
+                pool.apply(warm_index, (SIM_USERS[0],))
+                runs = pool.map(run_user, tasks, chunksize=1)
+
+            merged = {route: [] for route in ROUTES}
+            for samples in runs:
+                for route, values in samples.items():
+                    merged[route].extend(values)
+            report["results"][str(size)] = {route: summarize(values) for route, values in merged.items() if values}
+    finally:
+        if server is not None:
+            server.stop()
+        workdir.cleanup()
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    print_table(report, baseline)
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,202 @@
+"""Size and latency trade-off of storing secrets gzip-compressed.
+
+Two parts, reported together as JSON:
+
+- codec: for typical secret payloads (JSON and YAML config, PEM bundles,
+  random tokens) at several sizes, the compressed size and the time to
+  compress and decompress at each gzip level;
+- handler: `/save` and `/get` through `app.lambda_handler` against a local
+  moto S3 server, once with COMPRESSION=none and once with COMPRESSION=gzip,
+  with the stored size and the response bytes per request. `/get` is measured
+  both decompressed in Lambda and passed through to a client that accepts gzip.
+
+    pip install boto3 "moto[server]"
+    python benchmarks/compression.py --sizes 1024,65536,1048576 --iterations 50 -o compression.json
+"""
+import argparse
+import base64
+import gzip
+import json
+import logging
+import multiprocessing
+import os
+import random
+import sys
+import time
+
+from bench import git_commit, load_app, make_event, percentile
+
+LEVELS = [1, 6, 9]
+MODES = ["none", "gzip"]
+
+# -------------------- PAYLOADS --------------------
+def json_config(rng, size):
+    services, i = [], 0
+    while len(json.dumps(services)) < size:
+        services.append({
+            "name": f"service-{i}",
+            "url": f"https://service-{i}.internal.example.com:{8000 + i % 100}/api",
+            "timeout_ms": rng.choice([500, 1000, 3000]),
+            "retries": rng.randint(0, 5),
+            "token": os.urandom(12).hex(),
+        })
+        i += 1
+    return json.dumps({"services": services}, indent=2).encode()[:size]
+
+def yaml_config(rng, size):
+    lines, i = [], 0
+    while sum(len(line) + 1 for line in lines) < size:
+        lines += [f"db_{i}:", f"  host: db-{i}.cluster.local", f"  port: {5432 + i % 10}",
+                  f"  user: app_{rng.randint(1, 50)}", f"  password: {os.urandom(9).hex()}"]
+        i += 1
+    return "\n".join(lines).encode()[:size]
+
+def pem_bundle(rng, size):
+    blocks = []
+    while sum(len(b) for b in blocks) < size:
+        der = base64.encodebytes(os.urandom(rng.randint(800, 1400))).decode()
+        blocks.append(f"-----BEGIN CERTIFICATE-----\n{der}-----END CERTIFICATE-----\n")
+    return "".join(blocks).encode()[:size]
+
+def random_token(rng, size):
+    # Already high-entropy text; shows what the COMPRESS_MIN_SAVING cut-off is for.
+    return os.urandom(size // 2 + 1).hex().encode()[:size]
+
+PAYLOADS = {"json": json_config, "yaml": yaml_config, "pem": pem_bundle, "token": random_token}
+
+# -------------------- CODEC --------------------
+def timed(fn, iterations):
+    """Median milliseconds of `fn()` over `iterations` calls."""
+    samples = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return round(percentile(sorted(samples), 50), 4)
+
+def bench_codec(payloads, iterations):
+    results = {}
+    for name, data in payloads.items():
+        for level in LEVELS:
+            packed = gzip.compress(data, level, mtime=0)
+            results.setdefault(name, {})[str(level)] = {
+                "bytes": len(data),
+                "stored_bytes": len(packed),
+                "ratio": round(len(data) / len(packed), 2),
+                "compress_ms": timed(lambda: gzip.compress(data, level, mtime=0), iterations),
+                "decompress_ms": timed(lambda: gzip.decompress(packed), iterations),
+            }
+    return results
+
+# -------------------- HANDLER --------------------
+def run_mode(task):
+    """Save and read every payload through the handler with one COMPRESSION mode."""
+    mode, bucket, payloads, iterations = task
+    os.environ["COMPRESSION"] = mode
+    os.environ["SECRETS_BUCKET"] = bucket
+    app = load_app()
+
+    results = {}
+    for name, data in payloads.items():
+        key = f"bench/compression/{mode}/{name}"
+        body = base64.b64encode(data).decode()
+        create = make_event(app, "alice", "POST", "/create", f"key={key}", body)
+        create["isBase64Encoded"] = True
+        app.lambda_handler(create, None)
+
+        samples = {"save": [], "get": [], "get_gzip": []}
+        sizes = {}
+        for _ in range(iterations):
+            save = make_event(app, "alice", "POST", "/save", f"key={key}", body)
+            save["isBase64Encoded"] = True
+            start = time.perf_counter()
+            response = app.lambda_handler(save, None)
+            samples["save"].append((time.perf_counter() - start) * 1000)
+            sizes["stored_bytes"] = json.loads(response["body"])["entry"]["Size"]
+            # A cold read each time: the content cache would hide the S3 transfer.
+            app.content_cache.invalidate(key)
+
+            for route, headers in (("get", {}), ("get_gzip", {"accept-encoding": "gzip"})):
+                event = make_event(app, "alice", "GET", "/get", f"key={key}")
+                event["headers"].update(headers)
+                start = time.perf_counter()
+                response = app.lambda_handler(event, None)
+                samples[route].append((time.perf_counter() - start) * 1000)
+                sizes[f"{route}_response_bytes"] = len(response["body"])
+                app.content_cache.invalidate(key)
+
+        results[name] = {
+            **sizes,
+            **{f"{route}_p50_ms": round(percentile(sorted(values), 50), 3) for route, values in samples.items()},
+            **{f"{route}_p90_ms": round(percentile(sorted(values), 90), 3) for route, values in samples.items()},
+        }
+    return mode, results
+
+def print_table(report):
+    for size, part in report["results"].items():
+        print(f"\n{size} bytes", file=sys.stderr)
+        print(f"  {'payload':<8}{'ratio l6':>10}{'comp ms':>10}{'decomp ms':>10}"
+              f"{'get none':>10}{'get gzip':>10}{'pass ms':>10}{'resp B':>10}", file=sys.stderr)
+        for name, levels in part["codec"].items():
+            codec = levels["6"]
+            plain, packed = part["handler"]["none"][name], part["handler"]["gzip"][name]
+            print(f"  {name:<8}{codec['ratio']:>10.2f}{codec['compress_ms']:>10.3f}{codec['decompress_ms']:>10.3f}"
+                  f"{plain['get_p50_ms']:>10.2f}{packed['get_p50_ms']:>10.2f}{packed['get_gzip_p50_ms']:>10.2f}"
+                  f"{packed['get_gzip_response_bytes']:>10}", file=sys.stderr)
+
+# -------------------- MAIN --------------------
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", default="1024,65536,1048576", help="comma-separated payload sizes in bytes")
+    parser.add_argument("--iterations", type=int, default=30, help="timed repetitions per measurement")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("-o", "--output", help="write the JSON report here instead of stdout")
+    args = parser.parse_args()
+
+    os.environ.setdefault("AWS_ACCESS_KEY_ID", "bench")
+    os.environ.setdefault("AWS_SECRET_ACCESS_KEY", "bench")
+    os.environ.setdefault("AWS_DEFAULT_REGION", "us-east-1")
+    os.environ.setdefault("SESSION_SECRET", "bench")
+    os.environ.setdefault("METRICS_EMF", "false")
+
+    import boto3
+    from moto.server import ThreadedMotoServer
+
+    logging.getLogger("werkzeug").setLevel(logging.ERROR)
+    server = ThreadedMotoServer(ip_address="127.0.0.1", port=0, verbose=False)
+    server.start()
+    host, port = server.get_host_and_port()
+    os.environ["AWS_ENDPOINT_URL"] = f"http://{host}:{port}"
+    bucket = f"bench-compression-{os.getpid()}"
+    boto3.client("s3").create_bucket(Bucket=bucket)
+
+    report = {
+        "commit": git_commit(),
+        "python": sys.version.split()[0],
+        "started": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "config": {"iterations": args.iterations, "seed": args.seed, "levels": LEVELS},
+        "results": {},
+    }
+    context = multiprocessing.get_context("spawn")
+    try:
+        for size in (int(s) for s in args.sizes.split(",")):
+            rng = random.Random(args.seed + size)
+            payloads = {name: make(rng, size) for name, make in PAYLOADS.items()}
+            print(f"Measuring {size}-byte payloads...", file=sys.stderr)
+            # One process per mode: COMPRESSION is read when the app is imported.
+            with context.Pool(len(MODES)) as pool:
+                handler = dict(pool.map(run_mode, [(mode, bucket, payloads, args.iterations) for mode in MODES]))
+            report["results"][str(size)] = {"codec": bench_codec(payloads, args.iterations), "handler": handler}
+    finally:
+        server.stop()
+
+    print_table(report)
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+
+if __name__ == "__main__":
+    main()